@@ -2,38 +2,58 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
-from sqlalchemy.dialects.postgresql import ARRAY
-from sqlalchemy import func, text, update, or_
-import dateutil.parser
-import babel
+import csv
+import hashlib
+import io
+import json
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import func, update, and_, case, tuple_
+from sqlalchemy.exc import IntegrityError
 from flask import (
+    Blueprint,
     Flask,
+    abort,
+    current_app,
     jsonify,
     render_template,
     request,
     Response,
     flash,
     redirect,
+    stream_with_context,
     url_for,
 )
-from flask_migrate import Migrate
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+import click
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
+from search import search
+from genres import GenreList
+from cache import TAG_CHECK_INTERVAL, FragmentCache, TagGenerations
+from pagination import keyset_page
+from facets import adjust_genre_counts, genre_facets, rebuild_genre_counts
+from formatting import format_datetime, format_datetimes, to_datetime
+from routing import RoutingSQLAlchemy, pool_metrics, replica_reads
+from scheduling import DEFAULT_DURATION, Scheduler
+from querycount import QueryCounter
+import assets
+from templating import TemplateCache
+from matching import MATCH_LIMIT, MatchIndex
 
 # ----------------------------------------------------------------------------#
 # App Config.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object("config")
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-print("-----connected to db------")
+# Extensions are created unbound and attached in create_app, so importing
+# this module for its models, a CLI command or a test does no setup work.
+db = RoutingSQLAlchemy()
+fragment_cache = FragmentCache()
+scheduler = Scheduler()
+query_counter = QueryCounter()
+static_assets = assets.StaticAssets()
+template_cache = TemplateCache()
+match_index = MatchIndex()
+bp = Blueprint("fyyur", __name__, cli_group=None)
 
 
 # ----------------------------------------------------------------------------#
@@ -43,10 +63,29 @@ print("-----connected to db------")
 
 class Show(db.Model):
     __tablename__ = "Show"
+    __table_args__ = (
+        db.Index("ix_show_keyset", "start_time", "venue_id", "artist_id"),
+        db.Index("ix_show_artist_id", "artist_id"),
+    )
 
-    venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id"), primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id"), primary_key=True)
+    # Deleting a venue or an artist deletes its shows in the database.
+    venue_id = db.Column(
+        db.Integer, db.ForeignKey("Venue.id", ondelete="CASCADE"), primary_key=True
+    )
+    artist_id = db.Column(
+        db.Integer, db.ForeignKey("Artist.id", ondelete="CASCADE"), primary_key=True
+    )
     start_time = db.Column(db.DateTime, nullable=False)
+    # Minutes; on PostgreSQL the show_no_overlap exclusion constraint keeps
+    # a venue's [start_time, start_time + duration) periods disjoint.
+    duration = db.Column(
+        db.Integer, nullable=False, server_default=str(DEFAULT_DURATION)
+    )
+    # Set in Python on update: SQLite's CURRENT_TIMESTAMP has whole seconds,
+    # too coarse for the API ETags built from it.
+    updated_at = db.Column(
+        db.DateTime, nullable=False, server_default=func.now(), onupdate=datetime.utcnow
+    )
 
     def __repr__(self):
         return "Show(%s, %s)" % (self.venue_id, self.artist_id)
@@ -54,10 +93,14 @@ class Show(db.Model):
 
 class Venue(db.Model):
     __tablename__ = "Venue"
+    __table_args__ = (
+        db.Index("ix_venue_city_state", "city", "state"),
+        db.Index("ix_venue_name_id", "name", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
-    genres = db.Column(ARRAY(db.String), nullable=False)
+    genres = db.Column(GenreList, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120), nullable=False)
@@ -67,12 +110,14 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120), nullable=False)
     seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(500))
+    updated_at = db.Column(
+        db.DateTime, nullable=False, server_default=func.now(), onupdate=datetime.utcnow
+    )
     artists = db.relationship(
         "Artist",
         secondary=Show.__table__,
-        backref="venues",
-        single_parent=True,
-        cascade="all, delete-orphan",
+        backref=db.backref("venues", passive_deletes=True),
+        passive_deletes=True,
     )
 
     def __repr__(self):
@@ -81,45 +126,181 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = "Artist"
+    __table_args__ = (db.Index("ix_artist_name_id", "name", "id"),)
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120), nullable=False)
-    genres = db.Column(ARRAY(db.String), nullable=False)
+    genres = db.Column(GenreList, nullable=False)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120), nullable=False)
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(500))
+    updated_at = db.Column(
+        db.DateTime, nullable=False, server_default=func.now(), onupdate=datetime.utcnow
+    )
 
     def __repr__(self):
         return "Artist(%s, %s)" % (self.id, self.name)
 
 
+class FragmentTag(db.Model):
+    """How often a fragment cache tag was invalidated, shared by workers."""
+
+    __tablename__ = "FragmentTag"
+
+    tag = db.Column(db.String(120), primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return "FragmentTag(%s, %s)" % (self.tag, self.generation)
+
+
+class GenreCount(db.Model):
+    """Number of venues or artists per genre, kept current by the handlers."""
+
+    __tablename__ = "GenreCount"
+
+    kind = db.Column(db.String(20), primary_key=True)
+    genre = db.Column(db.String(120), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return "GenreCount(%s, %s, %s)" % (self.kind, self.genre, self.count)
+
+
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format="medium"):
-    date = dateutil.parser.parse(value)
-    if format == "full":
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == "medium":
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, locale="en_US")
+bp.add_app_template_filter(format_datetime, "datetime")
+
+# ----------------------------------------------------------------------------#
+# Fragment cache.
+# ----------------------------------------------------------------------------#
+
+
+def cached_page(key, template_name, load):
+    """Render a page whose title and content blocks go through fragment_cache.
+
+    `load()` only runs on a miss and returns (context, tags, ttl). The
+    layout, which carries flashed messages, is rendered fresh every time.
+    """
+    fragment = fragment_cache.get(key)
+    if fragment is None:
+        context, tags, ttl = load()
+        fragment = render_fragment(template_name, **context)
+        fragment_cache.set(key, fragment, tags, ttl)
+    return render_template("layouts/fragment.html", fragment=fragment)
+
+
+def stream_cached_page(key, template_name, load):
+    """Like cached_page, but a miss streams the content block as it renders.
+
+    The rendered chunks are collected on the way out and stored in
+    fragment_cache once the block has finished, unless they outgrow the
+    cache's byte budget: then collecting stops and the page is not cached,
+    so memory stays bounded however large the page.
+    """
+    fragment = fragment_cache.get(key)
+    if fragment is not None:
+        return render_template("layouts/fragment.html", fragment=fragment)
+
+    context, tags, ttl = load()
+    template = current_app.jinja_env.get_template(template_name)
+    current_app.update_template_context(context)
+    template_context = template.new_context(context)
+    title = "".join(template.blocks["title"](template_context))
+    head, tail = render_template(
+        "layouts/fragment.html",
+        fragment={"title": title, "content": FRAGMENT_MARKER},
+    ).split(FRAGMENT_MARKER)
+
+    def generate():
+        yield head
+        content, size = [], len(title)
+        for chunk in buffered(template.blocks["content"](template_context)):
+            if content is not None:
+                size += len(chunk)
+                if size > fragment_cache.max_bytes:
+                    content = None
+                else:
+                    content.append(chunk)
+            yield chunk
+        if content is not None:
+            fragment = {"title": title, "content": "".join(content)}
+            fragment_cache.set(key, fragment, tags, ttl)
+        yield tail
+
+    return Response(stream_with_context(generate()), mimetype="text/html")
+
+
+FRAGMENT_MARKER = "<!-- fragment -->"
+
+
+def buffered(strings, size=16 * 1024):
+    """Join many small strings into chunks of roughly `size` characters."""
+    pending, length = [], 0
+    for string in strings:
+        pending.append(string)
+        length += len(string)
+        if length >= size:
+            yield "".join(pending)
+            pending, length = [], 0
+    if pending:
+        yield "".join(pending)
+
+
+def listing_key(route):
+    return (
+        route,
+        request.args.get("after"),
+        request.args.get("before"),
+        request.args.get("genre"),
+    )
+
+
+def keyset_listing(query, columns):
+    """keyset_page positioned by the request's `after`/`before` cursor."""
+    try:
+        return keyset_page(
+            query,
+            columns,
+            after=request.args.get("after"),
+            before=request.args.get("before"),
+            per_page=current_app.config["LISTING_PAGE_SIZE"],
+        )
+    except ValueError:
+        abort(400)
+
+
+def render_fragment(template_name, **context):
+    template = current_app.jinja_env.get_template(template_name)
+    current_app.update_template_context(context)
+    template_context = template.new_context(context)
+    return {
+        name: "".join(template.blocks[name](template_context))
+        for name in ("title", "content")
+    }
+
 
+def seconds_until_next(shows):
+    """TTL that expires a page when its first upcoming show becomes past."""
+    if not shows:
+        return None
+    return (shows[0]["start_time"] - datetime.utcnow()).total_seconds()
 
-app.jinja_env.filters["datetime"] = format_datetime
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
 
-@app.route("/")
+@bp.route("/")
 def index():
     return render_template("pages/home.html")
 
@@ -128,81 +309,204 @@ def index():
 #  ----------------------------------------------------------------
 
 
-@app.route("/venues")
+@bp.route("/venues")
+@replica_reads
 def venues():
-    all_areas = (
-        Venue.query.with_entities(Venue.city, Venue.state)
-        .group_by(Venue.city, Venue.state)
-        .all()
-    )
-    data = []
-    for area in all_areas:
-        venues_in_city = (
-            Venue.query.filter(Venue.city == area[0])
-            .filter(Venue.state == area[1])
-            .all()
+    def load():
+        areas, page = venues_by_area()
+        context = {
+            "areas": areas,
+            "page": page,
+            "facets": genre_facets(db, Venue),
+            "current_genre": request.args.get("genre"),
+        }
+        return context, ("Venue", "Show"), None
+
+    return cached_page(listing_key("venues"), "pages/venues.html", load)
+
+
+def venues_by_area():
+    """One page of venues, grouped by (city, state), with upcoming show counts.
+
+    The page is keyed on (name, id) and fetched with a single aggregate
+    query, so the number of statements does not grow with the number of
+    areas and deep pages cost the same as the first.
+    """
+    page = keyset_listing(venue_area_query(request.args.get("genre")), VENUE_KEY)
+
+    # sorted() is stable, so venues stay in name order within an area.
+    rows = sorted(page.items, key=lambda row: (row.state, row.city))
+    areas = []
+    for (city, state), area_rows in groupby(rows, key=lambda row: (row.city, row.state)):
+        areas.append(
+            {
+                "city": city,
+                "state": state,
+                "venues": [
+                    {
+                        "id": row.id,
+                        "name": row.name,
+                        "num_upcoming_shows": row.num_upcoming_shows,
+                    }
+                    for row in area_rows
+                ],
+            }
         )
-        data.append({"city": area.city, "state": area.state, "venues": venues_in_city})
+    return areas, page
+
 
-    return render_template("pages/venues.html", areas=data)
+def venue_area_query(genre=None):
+    """Venues with their number of upcoming shows, optionally of one genre."""
+    now = datetime.utcnow()
+    query = (
+        db.session.query(
+            Venue.id,
+            Venue.name,
+            Venue.city,
+            Venue.state,
+            func.count(Show.venue_id).label("num_upcoming_shows"),
+        )
+        .outerjoin(Show, and_(Show.venue_id == Venue.id, Show.start_time > now))
+        .group_by(Venue.id, Venue.name, Venue.city, Venue.state)
+    )
+    if genre:
+        query = query.filter(Venue.genres.contains([genre]))
+    return query
 
 
 # Find venue by name, city, state
-@app.route("/venues/search", methods=["POST"])
+@bp.route("/venues/search", methods=["POST"])
+@replica_reads
 def search_venues():
     searchTerm = request.form.get("search_term", "")
-    search = "%{}%".format(searchTerm)
-    data = Venue.query.filter(
-        or_(
-            Venue.name.ilike(search),
-            Venue.city.ilike(search),
-            Venue.state.ilike(search),
-        )
-    ).all()
-    count = len(data)
-    response = {"count": count, "data": data}
+    page = request.form.get("page", 1, type=int)
+    genre = request.form.get("genre") or None
+    response = search(db, Venue, searchTerm, page=page, genre=genre)
 
     return render_template(
         "pages/search_venues.html",
         results=response,
         search_term=request.form.get("search_term", ""),
+        facets=genre_facets(db, Venue),
+        current_genre=genre,
     )
 
 
-@app.route("/venues/<int:venue_id>")
+@bp.route("/venues/<int:venue_id>")
+@replica_reads
 def show_venue(venue_id):
-    venue = db.session.query(Venue).filter(Venue.id == venue_id).first()
-
-    now = datetime.utcnow()
-    venue.upcoming_shows = (
-        db.session.query(Show)
-        .join(Venue, Show.venue_id == Venue.id)
-        .filter(Show.venue_id == venue_id, Show.start_time > now)
-        .all()
+    def load():
+        venue = load_venue_detail(venue_id)
+        if venue is None:
+            abort(404)
+        tags = {"venue:%d" % venue_id}
+        tags.update(
+            "artist:%d" % show["artist_id"]
+            for show in venue.upcoming_shows + venue.past_shows
+        )
+        return {"venue": venue}, tags, seconds_until_next(venue.upcoming_shows)
+
+    return cached_page(("show_venue", venue_id), "pages/show_venue.html", load)
+
+
+def load_venue_detail(venue_id):
+    """Venue with its past and upcoming shows, fetched in one statement."""
+    rows = venue_detail_query(venue_id).all()
+    if not rows:
+        return None
+
+    venue = rows[0].Venue
+    shows = [
+        {
+            "artist_id": row.artist_id,
+            "artist_name": row.artist_name,
+            "artist_image_link": row.artist_image_link,
+            "start_time": row.start_time,
+        }
+        for row in rows
+        if row.start_time is not None
+    ]
+    attach_shows(venue, shows)
+    return venue
+
+
+def load_artist_detail(artist_id):
+    """Artist with its past and upcoming shows, fetched in one statement."""
+    rows = artist_detail_query(artist_id).all()
+    if not rows:
+        return None
+
+    artist = rows[0].Artist
+    shows = [
+        {
+            "venue_id": row.venue_id,
+            "venue_name": row.venue_name,
+            "venue_image_link": row.venue_image_link,
+            "start_time": row.start_time,
+        }
+        for row in rows
+        if row.start_time is not None
+    ]
+    attach_shows(artist, shows)
+    return artist
+
+
+def venue_detail_query(venue_id):
+    return (
+        db.session.query(
+            Venue,
+            Show.start_time,
+            Artist.id.label("artist_id"),
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+        )
+        .outerjoin(Show, Show.venue_id == Venue.id)
+        .outerjoin(Artist, Artist.id == Show.artist_id)
+        .filter(Venue.id == venue_id)
     )
-    venue.upcoming_shows_count = len(venue.upcoming_shows)
-    venue.past_shows = (
-        db.session.query(Show)
-        .join(Venue, Show.venue_id == Venue.id)
-        .filter(Show.venue_id == venue_id, Show.start_time < now)
-        .all()
+
+
+def artist_detail_query(artist_id):
+    return (
+        db.session.query(
+            Artist,
+            Show.start_time,
+            Venue.id.label("venue_id"),
+            Venue.name.label("venue_name"),
+            Venue.image_link.label("venue_image_link"),
+        )
+        .outerjoin(Show, Show.artist_id == Artist.id)
+        .outerjoin(Venue, Venue.id == Show.venue_id)
+        .filter(Artist.id == artist_id)
     )
-    venue.past_shows_count = len(venue.past_shows)
 
-    return render_template("pages/show_venue.html", venue=venue)
+
+def attach_shows(entity, shows):
+    """Split shows into past/upcoming against a single `now`, with counts."""
+    now = datetime.utcnow()
+    shows.sort(key=lambda show: show["start_time"])
+    entity.upcoming_shows = [show for show in shows if show["start_time"] > now]
+    entity.past_shows = [show for show in shows if show["start_time"] <= now]
+    entity.upcoming_shows_count = len(entity.upcoming_shows)
+    entity.past_shows_count = len(entity.past_shows)
+    labels = format_datetimes([show["start_time"] for show in shows], "full")
+    for show, label in zip(shows, labels):
+        show["start_time_label"] = label
 
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
 
-@app.route("/venues/create", methods=["GET"])
+@bp.route("/venues/create", methods=["GET"])
 def create_venue_form():
+    from forms import VenueForm
+
     form = VenueForm()
     return render_template("forms/new_venue.html", form=form)
 
 
-@app.route("/venues/create", methods=["POST"])
+@bp.route("/venues/create", methods=["POST"])
 def create_venue_submission():
     response = {}
     error = False
@@ -225,13 +529,16 @@ def create_venue_submission():
         )
         response["name"] = venue.name
         db.session.add(venue)
+        adjust_genre_counts(db, Venue, added=genres)
         db.session.commit()
+        match_index.refresh(db, Venue, [venue.id])
     except:
         error = True
         db.session.rollback()
     finally:
         db.session.close()
         if error == False:
+            fragment_cache.invalidate("Venue")
             flash("Venue " + response["name"] + " was successfully listed!")
         else:
             flash(
@@ -242,84 +549,163 @@ def create_venue_submission():
     return render_template("pages/home.html")
 
 
-@app.route("/venues/<venue_id>", methods=["DELETE"])
+@bp.route("/venues/<venue_id>", methods=["DELETE"])
 def delete_venue(venue_id):
+    return delete_by_ids(Venue, [venue_id])
+
+
+@bp.route("/venues/delete", methods=["POST"])
+def delete_venues():
+    return delete_by_ids(Venue, bulk_delete_ids())
+
+
+MAX_BULK_DELETES = 1000
+
+
+def bulk_delete_ids():
+    """The ids of a {"ids": [...]} request body; aborts 400 or 413."""
+    body = request.get_json(silent=True) or {}
+    ids = body.get("ids")
+    if not isinstance(ids, list) or not ids:
+        abort(400)
+    if len(ids) > MAX_BULK_DELETES:
+        abort(413)
+    return ids
+
+
+def delete_by_ids(model, ids):
+    """Delete venues or artists with one DELETE ... WHERE id IN statement.
+
+    Their shows go with them through ON DELETE CASCADE, so no row is
+    loaded into the session: the genre counts and the pages to invalidate
+    are worked out from column queries beforehand.
+    """
+    try:
+        ids = {int(id) for id in ids}
+    except (TypeError, ValueError):
+        abort(400)
+    if model is Venue:
+        own_fk, other_fk, other = Show.venue_id, Show.artist_id, "artist"
+    else:
+        own_fk, other_fk, other = Show.artist_id, Show.venue_id, "venue"
+
     error = False
+    deleted = 0
     try:
-        venue = db.session.query(Venue).filter(Venue.id == venue_id).first()
-        db.session.delete(venue)
+        genres = [
+            genre
+            for (row_genres,) in db.session.query(model.genres).filter(
+                model.id.in_(ids)
+            )
+            for genre in row_genres
+        ]
+        counterparts = [
+            id
+            for (id,) in db.session.query(other_fk)
+            .filter(own_fk.in_(ids))
+            .distinct()
+        ]
+        adjust_genre_counts(db, model, removed=genres)
+        deleted = db.session.execute(
+            model.__table__.delete().where(model.id.in_(ids))
+        ).rowcount
         db.session.commit()
     except:
         error = True
         db.session.rollback()
     finally:
         db.session.close()
-        if error == False:
-            return jsonify({"success": True})
-        return jsonify({"success": False})
+    if error or not deleted:
+        return jsonify({"success": False, "deleted": 0})
+
+    kind = model.__tablename__.lower()
+    tags = [model.__tablename__, "Show"]
+    tags.extend("%s:%d" % (kind, id) for id in ids)
+    tags.extend("%s:%d" % (other, id) for id in counterparts)
+    # The deleted shows leave the calendars of the venues that held them.
+    scheduler.forget(*(ids if model is Venue else counterparts))
+    match_index.remove(model, ids)
+    fragment_cache.invalidate(*tags)
+    return jsonify({"success": True, "deleted": deleted})
 
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route("/artists")
+@bp.route("/artists")
+@replica_reads
 def artists():
-    artists = Artist.query.all()
+    def load():
+        genre = request.args.get("genre")
+        page = keyset_listing(artist_listing_query(genre), ARTIST_KEY)
+        context = {
+            "artists": page.items,
+            "page": page,
+            "facets": genre_facets(db, Artist),
+            "current_genre": genre,
+        }
+        return context, ("Artist",), None
+
+    return cached_page(listing_key("artists"), "pages/artists.html", load)
+
 
-    return render_template("pages/artists.html", artists=artists)
+def artist_listing_query(genre=None):
+    query = db.session.query(Artist.id, Artist.name)
+    if genre:
+        query = query.filter(Artist.genres.contains([genre]))
+    return query
 
 
 # Find artist by name, city, state
-@app.route("/artists/search", methods=["POST"])
+@bp.route("/artists/search", methods=["POST"])
+@replica_reads
 def search_artists():
     searchTerm = request.form.get("search_term", "")
-    search = "%{}%".format(searchTerm)
-    data = Artist.query.filter(
-        or_(
-            Artist.name.ilike(search),
-            Artist.city.ilike(search),
-            Artist.state.ilike(search),
-        )
-    ).all()
-    count = len(data)
-    response = {"count": count, "data": data}
+    page = request.form.get("page", 1, type=int)
+    genre = request.form.get("genre") or None
+    response = search(db, Artist, searchTerm, page=page, genre=genre)
 
     return render_template(
         "pages/search_artists.html",
         results=response,
         search_term=request.form.get("search_term", ""),
+        facets=genre_facets(db, Artist),
+        current_genre=genre,
     )
 
 
-@app.route("/artists/<int:artist_id>")
+@bp.route("/artists/<int:artist_id>")
+@replica_reads
 def show_artist(artist_id):
-    artist = Artist.query.filter_by(id=artist_id).first()
-    now = datetime.utcnow()
-    artist.upcoming_shows = (
-        db.session.query(Show)
-        .join(Artist, Show.artist_id == artist_id)
-        .filter(Show.artist_id == artist_id, Show.start_time > now)
-        .all()
-    )
-    if len(artist.upcoming_shows):
-        artist.upcoming_shows_count = len(artist.upcoming_shows)
-    artist.past_shows = (
-        db.session.query(Show)
-        .join(Artist, Show.artist_id == Artist.id)
-        .filter(Show.artist_id == artist_id, Show.start_time < now)
-        .all()
-    )
-    if len(artist.past_shows):
-        artist.past_shows_count = len(artist.past_shows)
-
-    print(artist.genres)
+    def load():
+        artist = load_artist_detail(artist_id)
+        if artist is None:
+            abort(404)
+        tags = {"artist:%d" % artist_id}
+        tags.update(
+            "venue:%d" % show["venue_id"]
+            for show in artist.upcoming_shows + artist.past_shows
+        )
+        return {"artist": artist}, tags, seconds_until_next(artist.upcoming_shows)
 
-    return render_template("pages/show_artist.html", artist=artist)
+    return cached_page(("show_artist", artist_id), "pages/show_artist.html", load)
 
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route("/artists/<int:artist_id>/edit", methods=["GET"])
+@bp.route("/artists/<int:artist_id>", methods=["DELETE"])
+def delete_artist(artist_id):
+    return delete_by_ids(Artist, [artist_id])
+
+
+@bp.route("/artists/delete", methods=["POST"])
+def delete_artists():
+    return delete_by_ids(Artist, bulk_delete_ids())
+
+
+@bp.route("/artists/<int:artist_id>/edit", methods=["GET"])
 def edit_artist(artist_id):
+    from forms import ArtistForm
+
     form = ArtistForm()
 
     # artist = {
@@ -341,8 +727,12 @@ def edit_artist(artist_id):
     return render_template("forms/edit_artist.html", form=form, artist=artist)
 
 
-@app.route("/artists/<int:artist_id>/edit", methods=["POST"])
+@bp.route("/artists/<int:artist_id>/edit", methods=["POST"])
 def edit_artist_submission(artist_id):
+    # Checked first: an UPDATE of a missing row would still count genres.
+    old_genres = db.session.query(Artist.genres).filter(Artist.id == artist_id).scalar()
+    if old_genres is None:
+        abort(404)
     error = False
     try:
         name = request.form.get("name")
@@ -364,7 +754,10 @@ def edit_artist_submission(artist_id):
                 facebook_link=facebook_link,
             )
         )
-        db.engine.execute(sql)
+        db.session.execute(sql)
+        adjust_genre_counts(db, Artist, added=genres, removed=old_genres)
+        db.session.commit()
+        match_index.refresh(db, Artist, [artist_id])
     except:
         error = True
         flash("Error while updating artist " + request.form.get("name"))
@@ -372,21 +765,27 @@ def edit_artist_submission(artist_id):
     finally:
         db.session.close()
         if error == False:
+            fragment_cache.invalidate("Artist", "artist:%d" % artist_id)
             flash("Artist was updated " + request.form.get("name") + " successfully!")
 
-    return redirect(url_for("show_artist", artist_id=artist_id))
+    return redirect(url_for(".show_artist", artist_id=artist_id))
 
 
-@app.route("/venues/<int:venue_id>/edit", methods=["GET"])
+@bp.route("/venues/<int:venue_id>/edit", methods=["GET"])
 def edit_venue(venue_id):
+    from forms import VenueForm
+
     form = VenueForm()
     venue = db.session.query(Venue).filter(Venue.id == venue_id).first()
 
     return render_template("forms/edit_venue.html", form=form, venue=venue)
 
 
-@app.route("/venues/<int:venue_id>/edit", methods=["POST"])
+@bp.route("/venues/<int:venue_id>/edit", methods=["POST"])
 def edit_venue_submission(venue_id):
+    old_genres = db.session.query(Venue.genres).filter(Venue.id == venue_id).scalar()
+    if old_genres is None:
+        abort(404)
     error = False
     try:
         name = request.form.get("name")
@@ -408,7 +807,10 @@ def edit_venue_submission(venue_id):
                 facebook_link=facebook_link,
             )
         )
-        db.engine.execute(sql)
+        db.session.execute(sql)
+        adjust_genre_counts(db, Venue, added=genres, removed=old_genres)
+        db.session.commit()
+        match_index.refresh(db, Venue, [venue_id])
     except:
         error = True
         flash("Error while updating venue " + request.form.get("name"))
@@ -416,19 +818,22 @@ def edit_venue_submission(venue_id):
     finally:
         db.session.close()
         if error == False:
+            fragment_cache.invalidate("Venue", "venue:%d" % venue_id)
             flash("Venue was updated " + request.form.get("name") + " successfully!")
-    return redirect(url_for("show_venue", venue_id=venue_id))
+    return redirect(url_for(".show_venue", venue_id=venue_id))
 
 
 #  Create Artist
 #  ----------------------------------------------------------------
-@app.route("/artists/create", methods=["GET"])
+@bp.route("/artists/create", methods=["GET"])
 def create_artist_form():
+    from forms import ArtistForm
+
     form = ArtistForm()
     return render_template("forms/new_artist.html", form=form)
 
 
-@app.route("/artists/create", methods=["POST"])
+@bp.route("/artists/create", methods=["POST"])
 def create_artist_submission():
     response = {}
     error = False
@@ -449,7 +854,9 @@ def create_artist_submission():
         )
         response["name"] = artist.name
         db.session.add(artist)
+        adjust_genre_counts(db, Artist, added=genres)
         db.session.commit()
+        match_index.refresh(db, Artist, [artist.id])
     except:
         error = True
         flash("An error occurred. Artist " + name + " could not be listed.")
@@ -457,6 +864,7 @@ def create_artist_submission():
     finally:
         db.session.close()
         if error == False:
+            fragment_cache.invalidate("Artist")
             flash("Artist " + response["name"] + " was successfully listed!")
 
     return render_template("pages/home.html")
@@ -466,49 +874,165 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 
-@app.route("/shows")
+@bp.route("/shows")
+@replica_reads
 def shows():
-    sql = text(
-        """select "Venue".id as venue_id, "Venue".name as venue_name, 
-        "Artist".id as artist_id, "Artist".name as artist_name, 
-        "Artist".image_link as artist_image_link, 
-        "Show".start_time as start_time from "Venue" inner join "Show" on "Venue".id="Show".venue_id 
-        inner join "Artist" on "Artist".id="Show".artist_id"""
+    def load():
+        page = keyset_listing(show_rows(), SHOW_KEY)
+        labels = format_datetimes([row.start_time for row in page.items], "full")
+        shows = [
+            dict(row._asdict(), start_time_label=label)
+            for row, label in zip(page.items, labels)
+        ]
+        return {"shows": shows, "page": page}, ("Show", "Venue", "Artist"), None
+
+    return stream_cached_page(listing_key("shows"), "pages/shows.html", load)
+
+
+@bp.route("/shows/export")
+@replica_reads
+def export_shows():
+    export_format = request.args.get("format", "csv")
+    if export_format not in SHOW_EXPORT_FORMATS:
+        abort(400)
+    mimetype, encode = SHOW_EXPORT_FORMATS[export_format]
+
+    def generate():
+        if export_format == "csv":
+            yield csv_line(SHOW_EXPORT_COLUMNS)
+        for chunk in buffered(encode(show) for show in iter_shows()):
+            yield chunk
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": "attachment; filename=shows.%s" % export_format
+        },
+    )
+
+
+def iter_shows(chunk_size=1000):
+    """Every show with its venue and artist, streamed from a server-side cursor.
+
+    Rows are fetched `chunk_size` at a time, so memory stays flat however
+    many shows there are.
+    """
+    return (
+        show_rows()
+        .order_by(*SHOW_KEY)
+        .execution_options(stream_results=True)
+        .yield_per(chunk_size)
+    )
+
+
+def show_rows():
+    return (
+        db.session.query(
+            Show.venue_id,
+            Venue.name.label("venue_name"),
+            Show.artist_id,
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+            Show.start_time,
+        )
+        .join(Venue, Venue.id == Show.venue_id)
+        .join(Artist, Artist.id == Show.artist_id)
+    )
+
+
+# Keyset pagination order of each listing, each backed by an index
+# (ix_show_keyset, ix_venue_name_id, ix_artist_name_id).
+SHOW_KEY = (Show.start_time, Show.venue_id, Show.artist_id)
+VENUE_KEY = (Venue.name, Venue.id)
+ARTIST_KEY = (Artist.name, Artist.id)
+
+
+SHOW_EXPORT_COLUMNS = (
+    "venue_id",
+    "venue_name",
+    "artist_id",
+    "artist_name",
+    "artist_image_link",
+    "start_time",
+)
+
+
+def csv_line(values):
+    line = io.StringIO()
+    csv.writer(line).writerow(values)
+    return line.getvalue()
+
+
+def show_csv(show):
+    return csv_line(
+        [getattr(show, column) for column in SHOW_EXPORT_COLUMNS[:-1]]
+        + [show.start_time.isoformat()]
     )
-    results = db.engine.execute(sql)
 
-    data = list()
-    for result in results:
-        data.append(result)
 
-    return render_template("pages/shows.html", shows=data)
+def show_ndjson(show):
+    record = {column: getattr(show, column) for column in SHOW_EXPORT_COLUMNS}
+    record["start_time"] = show.start_time.isoformat()
+    return json.dumps(record) + "\n"
+
+
+SHOW_EXPORT_FORMATS = {
+    "csv": ("text/csv", show_csv),
+    "ndjson": ("application/x-ndjson", show_ndjson),
+}
 
 
-@app.route("/shows/create")
+@bp.route("/shows/create")
 def create_shows():
     # renders form. do not touch.
+    from forms import ShowForm
+
     form = ShowForm()
     return render_template("forms/new_show.html", form=form)
 
 
-@app.route("/shows/create", methods=["POST"])
+@bp.route("/shows/create", methods=["POST"])
 def create_show_submission():
     error = False
+    conflict = False
     try:
         artist_id = request.form.get("artist_id")
         venue_id = request.form.get("venue_id")
-        start_time = request.form.get("start_time")
-
-        show = Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time)
-        db.session.add(show)
-        db.session.commit()
+        row = {
+            "venue_id": int(venue_id),
+            "artist_id": int(artist_id),
+            "start_time": to_datetime(request.form.get("start_time")),
+            "duration": int(request.form.get("duration") or DEFAULT_DURATION),
+        }
+        if row["duration"] < 1:
+            raise ValueError("duration must be positive")
+
+        if scheduler.conflicts(db, [row]):
+            conflict = True
+        else:
+            db.session.add(Show(**row))
+            db.session.commit()
+            scheduler.added([row])
+    except IntegrityError as e:
+        # The exclusion constraint caught a show booked since the check.
+        error = True
+        conflict = "show_no_overlap" in str(e.orig)
+        db.session.rollback()
     except:
         error = True
-        flash("An error occurred. Show could not be listed.")
         db.session.rollback()
     finally:
         db.session.close()
-        if error == False:
+        if conflict:
+            flash(
+                "Venue %s already has a show at that time. Show could not be listed."
+                % venue_id
+            )
+        elif error == False:
+            fragment_cache.invalidate(
+                "Show", "venue:%s" % venue_id, "artist:%s" % artist_id
+            )
             flash("Show was successfully listed!")
         else:
             flash("An error occurred. Show could not be listed.")
@@ -516,25 +1040,458 @@ def create_show_submission():
     return render_template("pages/home.html")
 
 
-@app.errorhandler(404)
+#  JSON API
+#  ----------------------------------------------------------------
+#  Every response carries a strong ETag computed from a cheap version
+#  query (ids and updated_at over the same index range, or an aggregate
+#  for detail pages). A matching If-None-Match returns 304 before the
+#  full rows are loaded or serialized.
+
+
+@bp.route("/api/v1/venues")
+@replica_reads
+def api_venues():
+    query = db.session.query(Venue.id, Venue.name, Venue.updated_at)
+    genre = request.args.get("genre")
+    if genre:
+        query = query.filter(Venue.genres.contains([genre]))
+    versions = keyset_listing(query, VENUE_KEY)
+
+    def build():
+        venues = Venue.query.filter(Venue.id.in_([row.id for row in versions.items]))
+        by_id = {venue.id: venue for venue in venues}
+        return listing_json(
+            versions, [venue_json(by_id[row.id]) for row in versions.items]
+        )
+
+    return conditional_json(versions.items, build)
+
+
+@bp.route("/api/v1/artists")
+@replica_reads
+def api_artists():
+    query = db.session.query(Artist.id, Artist.name, Artist.updated_at)
+    genre = request.args.get("genre")
+    if genre:
+        query = query.filter(Artist.genres.contains([genre]))
+    versions = keyset_listing(query, ARTIST_KEY)
+
+    def build():
+        artists = Artist.query.filter(
+            Artist.id.in_([row.id for row in versions.items])
+        )
+        by_id = {artist.id: artist for artist in artists}
+        return listing_json(
+            versions, [artist_json(by_id[row.id]) for row in versions.items]
+        )
+
+    return conditional_json(versions.items, build)
+
+
+@bp.route("/api/v1/shows")
+@replica_reads
+def api_shows():
+    versions = keyset_listing(
+        db.session.query(
+            Show.start_time,
+            Show.venue_id,
+            Show.artist_id,
+            Show.updated_at,
+            Venue.updated_at.label("venue_updated_at"),
+            Artist.updated_at.label("artist_updated_at"),
+        )
+        .join(Venue, Venue.id == Show.venue_id)
+        .join(Artist, Artist.id == Show.artist_id),
+        SHOW_KEY,
+    )
+
+    def build():
+        page = keyset_listing(show_rows(), SHOW_KEY)
+        shows = []
+        for row in page.items:
+            show = row._asdict()
+            show["start_time"] = row.start_time.isoformat()
+            shows.append(show)
+        return listing_json(page, shows)
+
+    return conditional_json(versions.items, build)
+
+
+@bp.route("/api/v1/venues/<int:venue_id>")
+@replica_reads
+def api_venue(venue_id):
+    version = detail_version(Venue, Show.venue_id, Artist, Show.artist_id, venue_id)
+
+    def build():
+        venue = load_venue_detail(venue_id)
+        return detail_json(venue, venue_json(venue))
+
+    return conditional_json(version, build)
+
+
+@bp.route("/api/v1/artists/<int:artist_id>")
+@replica_reads
+def api_artist(artist_id):
+    version = detail_version(Artist, Show.artist_id, Venue, Show.venue_id, artist_id)
+
+    def build():
+        artist = load_artist_detail(artist_id)
+        return detail_json(artist, artist_json(artist))
+
+    return conditional_json(version, build)
+
+
+@bp.route("/api/v1/venues/<int:venue_id>/matches")
+@replica_reads
+def api_venue_matches(venue_id):
+    return matches_json(Venue, venue_id, Artist)
+
+
+@bp.route("/api/v1/artists/<int:artist_id>/matches")
+@replica_reads
+def api_artist_matches(artist_id):
+    return matches_json(Artist, artist_id, Venue)
+
+
+MAX_MATCH_LIMIT = 50
+
+
+def matches_json(model, id, counterpart):
+    """Seeking `counterpart` rows ranked by shared genres, then by place."""
+    entity = (
+        db.session.query(model.genres, model.city, model.state)
+        .filter(model.id == id)
+        .first()
+    )
+    if entity is None:
+        abort(404)
+    limit = request.args.get("limit", MATCH_LIMIT, type=int)
+    matches = match_index.matches(
+        db,
+        counterpart,
+        entity.genres,
+        entity.city,
+        entity.state,
+        limit=max(1, min(limit, MAX_MATCH_LIMIT)),
+    )
+    genres = set(entity.genres)
+    return jsonify(
+        {
+            "data": [
+                dict(
+                    entry,
+                    score=float(score),
+                    shared_genres=sorted(genres.intersection(entry["genres"])),
+                )
+                for score, entry in matches
+            ]
+        }
+    )
+
+
+def conditional_json(version, build):
+    """JSON response for `build()`, or 304 if the client's ETag is current."""
+    etag = hashlib.sha1(repr((request.full_path, version)).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    return response
+
+
+def detail_version(model, show_fk, counterpart, counterpart_fk, entity_id):
+    """One aggregate row that changes whenever the detail payload would."""
+    now = datetime.utcnow()
+    version = (
+        db.session.query(
+            func.max(model.updated_at),
+            func.count(Show.start_time),
+            func.max(Show.updated_at),
+            func.max(counterpart.updated_at),
+            func.sum(case([(Show.start_time > now, 1)], else_=0)),
+        )
+        .outerjoin(Show, show_fk == model.id)
+        .outerjoin(counterpart, counterpart.id == counterpart_fk)
+        .filter(model.id == entity_id)
+        .one()
+    )
+    if version[0] is None:
+        abort(404)
+    return tuple(version)
+
+
+def listing_json(page, data):
+    return {
+        "data": data,
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+    }
+
+
+def detail_json(entity, data):
+    for kind in ("upcoming_shows", "past_shows"):
+        # start_time_label is the display form for the HTML pages only.
+        data[kind] = [
+            {
+                key: value.isoformat() if key == "start_time" else value
+                for key, value in show.items()
+                if key != "start_time_label"
+            }
+            for show in getattr(entity, kind)
+        ]
+        data[kind + "_count"] = getattr(entity, kind + "_count")
+    return data
+
+
+def venue_json(venue):
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres,
+        "city": venue.city,
+        "state": venue.state,
+        "address": venue.address,
+        "phone": venue.phone,
+        "website": venue.website,
+        "image_link": venue.image_link,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+    }
+
+
+def artist_json(artist):
+    return {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website,
+        "image_link": artist.image_link,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+    }
+
+
+@bp.route("/metrics")
+def metrics():
+    return Response(pool_metrics.render(), mimetype="text/plain")
+
+
+MAX_BULK_SHOWS = 1000
+
+
+@bp.route("/shows/bulk", methods=["POST"])
+def create_shows_bulk():
+    """Schedule many shows, e.g. a tour, in a single transaction.
+
+    Expects {"shows": [{"artist_id", "venue_id", "start_time"}, ...]}, each
+    with an optional duration in minutes. All artist and venue ids are
+    checked with one IN query each, overlaps with booked shows and with
+    each other in one scheduler call, and every valid show is written with
+    one multi-row INSERT. Returns a result per submitted show, in order.
+    """
+    body = request.get_json(silent=True) or {}
+    submitted = body.get("shows")
+    if not isinstance(submitted, list) or not submitted:
+        abort(400)
+    if len(submitted) > MAX_BULK_SHOWS:
+        abort(413)
+
+    results, rows = [], []
+    for index, item in enumerate(submitted):
+        try:
+            row = {
+                "venue_id": int(item["venue_id"]),
+                "artist_id": int(item["artist_id"]),
+                "start_time": to_datetime(item["start_time"]),
+                "duration": int(item.get("duration", DEFAULT_DURATION)),
+            }
+            if row["duration"] < 1:
+                raise ValueError("duration must be positive")
+        except (KeyError, TypeError, ValueError, OverflowError):
+            results.append({"index": index, "status": "error", "error": "invalid show"})
+            continue
+        results.append({"index": index, "status": "created"})
+        rows.append((index, row))
+
+    venue_ids = {row["venue_id"] for index, row in rows}
+    artist_ids = {row["artist_id"] for index, row in rows}
+    known_venues = {
+        id for (id,) in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))
+    }
+    known_artists = {
+        id for (id,) in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))
+    }
+    pairs = {(row["venue_id"], row["artist_id"]) for index, row in rows}
+    booked = set(
+        db.session.query(Show.venue_id, Show.artist_id).filter(
+            tuple_(Show.venue_id, Show.artist_id).in_(pairs)
+        )
+    )
+
+    candidates = []
+    for index, row in rows:
+        pair = (row["venue_id"], row["artist_id"])
+        if row["venue_id"] not in known_venues:
+            error = "unknown venue %d" % row["venue_id"]
+        elif row["artist_id"] not in known_artists:
+            error = "unknown artist %d" % row["artist_id"]
+        elif pair in booked:
+            error = "artist %d is already booked at venue %d" % (pair[1], pair[0])
+        else:
+            booked.add(pair)
+            candidates.append((index, row))
+            continue
+        results[index].update(status="error", error=error)
+
+    overlapping = scheduler.conflicts(db, [row for index, row in candidates])
+    valid = []
+    for position, (index, row) in enumerate(candidates):
+        if position in overlapping:
+            results[index].update(
+                status="error",
+                error="overlaps another show at venue %d" % row["venue_id"],
+            )
+        else:
+            valid.append(row)
+
+    if valid:
+        try:
+            db.session.execute(Show.__table__.insert().values(valid))
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent booking won the race; nothing was written.
+            db.session.rollback()
+            abort(409)
+        except:
+            db.session.rollback()
+            abort(500)
+        finally:
+            db.session.close()
+        scheduler.added(valid)
+        tags = {"Show"}
+        for row in valid:
+            tags.add("venue:%d" % row["venue_id"])
+            tags.add("artist:%d" % row["artist_id"])
+        fragment_cache.invalidate(*tags)
+
+    return jsonify(
+        {
+            "success": len(valid) == len(submitted),
+            "created": len(valid),
+            "results": results,
+        }
+    )
+
+
+#  Bulk import
+#  ----------------------------------------------------------------
+
+
+@bp.cli.command("fyyur-import")
+@click.option("--venues", type=click.Path(exists=True), help="Venue CSV/NDJSON file.")
+@click.option("--artists", type=click.Path(exists=True), help="Artist CSV/NDJSON file.")
+@click.option("--shows", type=click.Path(exists=True), help="Show CSV/NDJSON file.")
+@click.option("--chunk-size", default=5000, show_default=True)
+def fyyur_import(venues, artists, shows, chunk_size):
+    """Bulk load venues, artists and shows from CSV or NDJSON files.
+
+    Shows may reference venues and artists by venue_id/artist_id or by
+    venue_name/artist_name, and may give a duration in minutes; shows that
+    overlap another at their venue are rejected. Genres in CSV files are
+    separated by ";".
+    """
+    from importer import Importer
+
+    importer = Importer(db, chunk_size=chunk_size, scheduler=scheduler)
+    for table_name, path in (("Venue", venues), ("Artist", artists), ("Show", shows)):
+        if path is None:
+            continue
+        report = importer.load(table_name, path)
+        click.echo(
+            "%s: %d imported, %d rejected in %.1fs (%.0f rows/s)"
+            % (
+                table_name,
+                report["imported"],
+                report["rejected"],
+                report["seconds"],
+                report["rows_per_second"],
+            )
+        )
+        for error in report["errors"]:
+            click.echo("  " + error, err=True)
+    for model, path in ((Venue, venues), (Artist, artists)):
+        if path is not None:
+            rebuild_genre_counts(db, model)
+
+
+@bp.cli.command("fyyur-assets")
+def fyyur_assets():
+    """Fingerprint and precompress the static files into static/dist."""
+    manifest = assets.build(current_app.static_folder)
+    click.echo("%d assets written to %s" % (len(manifest), assets.DIST))
+
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
+    if request.path.startswith("/api/"):
+        return jsonify({"success": False, "error": 404, "message": "Not found"}), 404
     return render_template("errors/404.html"), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return render_template("errors/500.html"), 500
 
 
-if not app.debug:
-    file_handler = FileHandler("error.log")
-    file_handler.setFormatter(
-        Formatter("%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]")
+def create_app(config="config", test_config=None):
+    """Build a Fyyur app from `config`, a settings object or import path.
+
+    `test_config`, a dict, overrides single settings on top of it.
+    """
+    # Flask-Migrate and Flask-Moment pull in alembic and pkg_resources;
+    # only a running app needs them.
+    from flask_migrate import Migrate
+    from flask_moment import Moment
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+    if test_config is not None:
+        app.config.update(test_config)
+    Moment(app)
+    db.init_app(app)
+    Migrate(app, db)
+    fragment_cache.init_app(
+        app,
+        TagGenerations(
+            db, app.config.get("FRAGMENT_TAG_CHECK_INTERVAL", TAG_CHECK_INTERVAL)
+        ),
     )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info("errors")
+    query_counter.init_app(app)
+    static_assets.init_app(app)
+    template_cache.init_app(app)
+    match_index.init_app(app)
+    app.register_blueprint(bp)
+    template_cache.warm_up(app)
+
+    if not app.debug:
+        file_handler = FileHandler("error.log")
+        file_handler.setFormatter(
+            Formatter(
+                "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]"
+            )
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info("errors")
+    return app
+
 
 # ----------------------------------------------------------------------------#
 # Launch.
@@ -542,12 +1499,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == "__main__":
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 """
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 """
-
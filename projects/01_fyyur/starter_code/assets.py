@@ -0,0 +1,161 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # brotli variants are skipped without the package
+    brotli = None
+
+DIST = "dist"
+MANIFEST = "manifest.json"
+COMPRESSIBLE = (".css", ".js", ".map", ".svg", ".eot", ".ttf", ".otf", ".txt")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Preferred first.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def build(static_folder):
+    """Write fingerprinted, precompressed copies of the static files.
+
+    Every file under `static_folder` is copied to dist/ with a content
+    hash in its name (css/main.css -> dist/css/main.1a2b3c4d5e6f.css),
+    and compressible ones get .gz and, when the brotli package is
+    installed, .br siblings. url() references in stylesheets are rewritten
+    to the fingerprinted names before the stylesheets are hashed. Writes
+    dist/manifest.json and returns the mapping it contains.
+    """
+    dist = os.path.join(static_folder, DIST)
+    sources = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [name for name in dirs if os.path.join(root, name) != dist]
+        for name in files:
+            if not name.startswith("."):
+                path = os.path.relpath(os.path.join(root, name), static_folder)
+                sources.append(path.replace(os.sep, "/"))
+
+    manifest = {}
+    # Stylesheets last, so the files they reference are already hashed.
+    for path in sorted(sources, key=lambda path: (path.endswith(".css"), path)):
+        with open(os.path.join(static_folder, path), "rb") as f:
+            content = f.read()
+        if path.endswith(".css"):
+            content = rewrite_css_urls(content.decode("utf-8"), path, manifest).encode(
+                "utf-8"
+            )
+        stem, extension = posixpath.splitext(path)
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        target = "%s/%s.%s%s" % (DIST, stem, digest, extension)
+        write_variants(os.path.join(static_folder, target), content)
+        manifest[path] = target
+
+    with open(os.path.join(dist, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def rewrite_css_urls(css, path, manifest):
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        quote, url = match.groups()
+        if ":" in url or url.startswith("/"):
+            return match.group(0)
+        reference, suffix = re.match(r"([^?#]*)(.*)", url).groups()
+        resolved = posixpath.normpath(posixpath.join(directory, reference))
+        if resolved not in manifest:
+            return match.group(0)
+        # dist/ mirrors the source tree, so only the file name changes.
+        fingerprinted = posixpath.join(
+            posixpath.dirname(reference), posixpath.basename(manifest[resolved])
+        )
+        return "url(%s%s%s%s)" % (quote, fingerprinted, suffix, quote)
+
+    return _CSS_URL.sub(replace, css)
+
+
+def write_variants(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    if not path.endswith(COMPRESSIBLE):
+        return
+    variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(content)
+    for suffix, compressed in variants.items():
+        # Only worth serving when it actually saves bytes.
+        if len(compressed) < len(content):
+            with open(path + suffix, "wb") as f:
+                f.write(compressed)
+
+
+class StaticAssets(object):
+    """Serves the output of `build` in place of the plain static files.
+
+    `url_for("static", filename=...)` resolves to the fingerprinted name
+    whenever the manifest lists the file, and those responses carry an
+    immutable Cache-Control, so repeat visits make no requests for them.
+    The precompressed variant matching Accept-Encoding is sent as is. In
+    production a front server should serve static/dist directly, e.g.
+    nginx's `gzip_static on; brotli_static on;` with a one-year expiry,
+    leaving Python out of asset requests altogether.
+    """
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.fingerprinted = frozenset()
+        self.variants = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        path = app.config.get("STATIC_ASSET_MANIFEST")
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+        self.fingerprinted = frozenset(self.manifest.values())
+        self.variants = {
+            target: [
+                (encoding, suffix)
+                for encoding, suffix in ENCODINGS
+                if os.path.exists(os.path.join(self.static_folder, target + suffix))
+            ]
+            for target in self.fingerprinted
+        }
+
+        @app.url_defaults
+        def fingerprint_static_urls(endpoint, values):
+            if endpoint == "static" and values.get("filename") in self.manifest:
+                values["filename"] = self.manifest[values["filename"]]
+
+        app.view_functions["static"] = self.send_static_file
+
+    def send_static_file(self, filename):
+        if filename not in self.fingerprinted:
+            return send_from_directory(self.static_folder, filename)
+
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in self.variants[filename]:
+            if request.accept_encodings[encoding]:
+                response = send_from_directory(
+                    self.static_folder, filename + suffix, mimetype=mimetype
+                )
+                response.headers["Content-Encoding"] = encoding
+                break
+        else:
+            response = send_from_directory(
+                self.static_folder, filename, mimetype=mimetype
+            )
+        response.headers["Cache-Control"] = IMMUTABLE
+        response.vary.add("Accept-Encoding")
+        return response
@@ -0,0 +1,92 @@
+"""Measure how long Fyyur takes to import and to build its app.
+
+Each measurement runs in a fresh interpreter, so module caches do not hide
+the cost a CLI command, migration or test run pays on startup:
+
+    python bench_import_time.py [--runs 7] [--top 10] [--max-import-ms MS]
+
+Prints the median wall time of `import app` and of `create_app()`, and the
+modules that contribute most to the import according to
+`python -X importtime`. With --max-import-ms the script exits non-zero
+when importing takes longer than that, so CI can catch regressions.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+TIMED = """
+import time
+started = time.perf_counter()
+%s
+print(time.perf_counter() - started)
+"""
+
+STEPS = (
+    ("import app", "import app"),
+    ("create_app()", "import app\napp.create_app()"),
+)
+
+
+def run(code, *flags):
+    return subprocess.run(
+        [sys.executable] + list(flags) + ["-c", code],
+        cwd=HERE,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+
+def median_ms(code, runs):
+    samples = [
+        float(run(TIMED % code).stdout.strip().splitlines()[-1]) * 1000
+        for _ in range(runs)
+    ]
+    return statistics.median(samples)
+
+
+def heaviest_imports(top):
+    """(cumulative microseconds, module) of the slowest direct imports."""
+    imports = []
+    for line in run("import app", "-X", "importtime").stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        # importtime indents by two spaces per level after one separator.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if cumulative_us.strip().isdigit() and depth == 1:
+            imports.append((int(cumulative_us), name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--max-import-ms", type=float)
+    args = parser.parse_args()
+
+    results = {}
+    for label, code in STEPS:
+        results[label] = median_ms(code, args.runs)
+        print("%-14s %8.1f ms (median of %d)" % (label, results[label], args.runs))
+    print("\nheaviest imports:")
+    for cumulative_us, name in heaviest_imports(args.top):
+        print("  %8.1f ms  %s" % (cumulative_us / 1000, name))
+
+    if args.max_import_ms is not None and results["import app"] > args.max_import_ms:
+        print(
+            "\nimport app took %.1f ms, limit is %.1f ms"
+            % (results["import app"], args.max_import_ms)
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+TAG_CHECK_INTERVAL = 2
+
+
+class FragmentCache(object):
+    """Rendered HTML fragments kept in memory, evicted least-recently-used.
+
+    Entries are bounded by a byte budget rather than an entry count, and
+    each entry carries a set of tags naming the rows it was rendered from
+    (a table name such as "Venue", or an entity such as "venue:3").
+    Write handlers call `invalidate` with the tags they touched, which
+    drops exactly the fragments built from that data.
+
+    Each worker keeps its own copy. With `generations` (a TagGenerations)
+    an invalidation also bumps a per-tag counter in the database, and a
+    hit is only served while its tags' counters still match the ones it
+    was stored with, so a write handled by one worker retires the pages
+    of every worker, within the TagGenerations check interval. A write
+    landing between a page's queries and its `set` can leave the page
+    stale until its TTL expires.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=300, generations=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.generations = generations
+        self.size = 0
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, generations=None):
+        self.max_bytes = app.config.get("FRAGMENT_CACHE_MAX_BYTES", self.max_bytes)
+        self.ttl = app.config.get("FRAGMENT_CACHE_TTL", self.ttl)
+        if generations is not None:
+            self.generations = generations
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, tags, size, expires_at, stamp = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+        if self.generations is not None and tags:
+            if self.generations.current(tags) != stamp:
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        self._remove(key)
+                return None
+        return value
+
+    def set(self, key, value, tags=(), ttl=None):
+        """Store `value`, a dict of block name to rendered HTML."""
+        size = sum(len(html) for html in value.values())
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + (self.ttl if ttl is None else min(ttl, self.ttl))
+        tags = frozenset(tags)
+        stamp = {}
+        if self.generations is not None and tags:
+            stamp = self.generations.current(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, tags, size, expires_at, stamp)
+            self.size += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+        if self.generations is not None and tags:
+            self.generations.bump(tags)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        value, tags, size, expires_at, stamp = self._entries.pop(key)
+        self.size -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class TagGenerations(object):
+    """Invalidation counters per cache tag, in the FragmentTag table.
+
+    A counter read from the table is trusted for `interval` seconds, so
+    most cache hits run no query, and a bump made by another worker is
+    seen at most that late. `bump` commits on its own, so call it after
+    the write it announces has been committed.
+    """
+
+    def __init__(self, db, interval=TAG_CHECK_INTERVAL):
+        self.db = db
+        self.interval = interval
+        self._known = {}
+        self._lock = threading.Lock()
+
+    def current(self, tags):
+        """{tag: generation} of `tags`, 0 for those never bumped."""
+        now = time.time()
+        with self._lock:
+            stale = [
+                tag
+                for tag in tags
+                if tag not in self._known or self._known[tag][1] <= now - self.interval
+            ]
+        if stale:
+            read = self._read(stale)
+            with self._lock:
+                for tag in stale:
+                    # Counters only grow: keep a newer value a concurrent
+                    # read may have stored meanwhile.
+                    known = self._known.get(tag, (0, now))[0]
+                    self._known[tag] = (max(known, read.get(tag, 0)), now)
+        with self._lock:
+            return {tag: self._known[tag][0] for tag in tags}
+
+    def bump(self, tags):
+        """Increment the counters of `tags`, with at most three statements."""
+        tags = sorted(set(tags))
+        table = self.db.metadata.tables["FragmentTag"]
+        session = self.db.session
+        if self.db.engine.dialect.name == "postgresql":
+            statement = postgresql.insert(table).values(
+                [{"tag": tag, "generation": 1} for tag in tags]
+            )
+            session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[table.c.tag],
+                    set_={"generation": table.c.generation + 1},
+                )
+            )
+        else:
+            existing = set(self._read(tags))
+            if existing:
+                session.execute(
+                    table.update()
+                    .where(table.c.tag.in_(sorted(existing)))
+                    .values(generation=table.c.generation + 1)
+                )
+            missing = [tag for tag in tags if tag not in existing]
+            if missing:
+                session.execute(
+                    table.insert(), [{"tag": tag, "generation": 1} for tag in missing]
+                )
+        session.commit()
+        with self._lock:
+            for tag in tags:
+                self._known.pop(tag, None)
+
+    def _read(self, tags):
+        table = self.db.metadata.tables["FragmentTag"]
+        return dict(
+            self.db.session.execute(
+                select([table.c.tag, table.c.generation]).where(
+                    table.c.tag.in_(sorted(tags))
+                )
+            ).fetchall()
+        )
@@ -0,0 +1,131 @@
+"""Assert that the hot queries in app.py are answered from their index.
+
+Run against a migrated PostgreSQL database:
+
+    python check_query_plans.py
+
+The statements checked are the ones the app runs, built by its own query
+functions: the keyset-paged listings, the detail pages, the genre filters
+and search. Sequential scans are disabled for the session so that the
+planner picks an index whenever one can serve the query, even on a small
+development table. A query whose plan does not use the expected index (or
+any index of the checked table, where none is named) exits non-zero.
+"""
+import sys
+from datetime import datetime
+
+from app import (
+    ARTIST_KEY,
+    SHOW_KEY,
+    VENUE_KEY,
+    Artist,
+    Venue,
+    artist_detail_query,
+    artist_listing_query,
+    create_app,
+    db,
+    show_rows,
+    venue_area_query,
+    venue_detail_query,
+)
+from pagination import encode_cursor, keyset_query
+from search import search_page_query, search_query
+
+
+def hot_queries():
+    """(name, table, expected index or None, query) for each checked query."""
+    return [
+        (
+            "venue listing",
+            "Venue",
+            "ix_venue_name_id",
+            keyset_query(
+                venue_area_query(), VENUE_KEY, after=encode_cursor(["M", 1])
+            ),
+        ),
+        (
+            "artist listing",
+            "Artist",
+            "ix_artist_name_id",
+            keyset_query(
+                artist_listing_query(), ARTIST_KEY, after=encode_cursor(["M", 1])
+            ),
+        ),
+        (
+            "show listing",
+            "Show",
+            "ix_show_keyset",
+            keyset_query(
+                show_rows(), SHOW_KEY, after=encode_cursor([datetime(2020, 1, 1), 1, 1])
+            ),
+        ),
+        ("venue detail", "Show", None, venue_detail_query(1)),
+        ("artist detail", "Show", "ix_show_artist_id", artist_detail_query(1)),
+        (
+            "venue genre filter",
+            "Venue",
+            "ix_venue_genres",
+            keyset_query(venue_area_query("Jazz"), VENUE_KEY),
+        ),
+        (
+            "artist genre filter",
+            "Artist",
+            "ix_artist_genres",
+            keyset_query(artist_listing_query("Jazz"), ARTIST_KEY),
+        ),
+        (
+            "venue search",
+            "Venue",
+            "ix_venue_name_trgm",
+            search_page_query(db, Venue, search_query(db, Venue, "jazz"), "jazz"),
+        ),
+        (
+            "artist search",
+            "Artist",
+            "ix_artist_name_trgm",
+            search_page_query(db, Artist, search_query(db, Artist, "jazz"), "jazz"),
+        ),
+    ]
+
+
+def scanned_tables(plan, seq_scans, index_scans, indexes):
+    relation = plan.get("Relation Name")
+    if relation:
+        if plan["Node Type"] == "Seq Scan":
+            seq_scans.add(relation)
+        else:
+            index_scans.add(relation)
+    if plan.get("Index Name"):
+        indexes.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        scanned_tables(child, seq_scans, index_scans, indexes)
+
+
+def main():
+    failures = 0
+    with create_app().app_context():
+        connection = db.engine.connect()
+        connection.execute("SET enable_seqscan = off")
+        for name, table, index, query in hot_queries():
+            # Compiled for the connected server, so the backslash in the
+            # search's ESCAPE clause matches its standard_conforming_strings.
+            compiled = query.statement.compile(dialect=connection.dialect)
+            plan = connection.execute(
+                "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+            ).scalar()[0]["Plan"]
+            seq_scans, index_scans, indexes = set(), set(), set()
+            scanned_tables(plan, seq_scans, index_scans, indexes)
+            if index:
+                ok = index in indexes
+                result = "uses " + index if ok else "DOES NOT USE " + index
+            else:
+                ok = table in index_scans and table not in seq_scans
+                result = "index scan" if ok else "SEQUENTIAL SCAN"
+            failures += not ok
+            print("%-22s %s" % (name, result))
+        connection.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
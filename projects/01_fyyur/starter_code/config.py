@@ -1,6 +1,9 @@
 import os
 
-SECRET_KEY = os.urandom(32)
+# Signs the session cookie, which also carries the read-your-writes window
+# of routing.py; every worker must share it, so set FYYUR_SECRET_KEY in
+# production. The random fallback only suits a single development process.
+SECRET_KEY = os.environ.get("FYYUR_SECRET_KEY") or os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -11,3 +14,51 @@ DEBUG = True
 
 # IMPLEMENT DATABASE URL
 SQLALCHEMY_DATABASE_URI = "postgres://george@localhost:5432/fyyurdb"
+
+# Read replicas for the views marked @replica_reads, comma separated
+# (see routing.py)
+SQLALCHEMY_REPLICA_URIS = [
+    uri for uri in os.environ.get("FYYUR_REPLICA_URIS", "").split(",") if uri
+]
+# Clients keep reading from the primary this long after they write
+SQLALCHEMY_REPLICA_STICKY_SECONDS = 5
+
+# Connection pool, shared by the primary and each replica
+SQLALCHEMY_ENGINE_OPTIONS = {
+    "pool_size": int(os.environ.get("FYYUR_DB_POOL_SIZE", 10)),
+    "max_overflow": int(os.environ.get("FYYUR_DB_MAX_OVERFLOW", 20)),
+    "pool_timeout": int(os.environ.get("FYYUR_DB_POOL_TIMEOUT", 30)),
+    "pool_recycle": int(os.environ.get("FYYUR_DB_POOL_RECYCLE", 1800)),
+    "pool_pre_ping": True,
+}
+
+# Rendered page fragments cache (see cache.py)
+FRAGMENT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+FRAGMENT_CACHE_TTL = 300
+# Seconds a worker trusts its copy of the shared invalidation counters
+FRAGMENT_TAG_CHECK_INTERVAL = 2
+
+# Rows per page on the keyset-paginated listings (see pagination.py)
+LISTING_PAGE_SIZE = 50
+
+# Per-request query counting (see projects/shared/querycount.py). With
+# QUERY_BUDGET_STRICT a request running more than its budget of queries
+# raises an error.
+QUERY_BUDGET = None
+QUERY_BUDGETS = {}
+QUERY_BUDGET_STRICT = False
+
+# Fingerprinted static files written by `flask fyyur-assets` (see assets.py);
+# plain static files are served while it does not exist
+STATIC_ASSET_MANIFEST = os.path.join(basedir, "static", "dist", "manifest.json")
+
+# Compiled templates shared by all workers, and compiled at startup rather
+# than on first use (see templating.py). Without a directory, Jinja's
+# private per-user cache directory is used.
+JINJA_BYTECODE_CACHE = True
+JINJA_BYTECODE_CACHE_DIR = os.environ.get("FYYUR_JINJA_CACHE_DIR")
+JINJA_WARM_UP = True
+
+# Genre match index, rebuilt this often to pick up other workers' and
+# imported rows (see matching.py)
+MATCH_INDEX_REBUILD_INTERVAL = 300
@@ -0,0 +1,71 @@
+from collections import Counter
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql
+
+
+def adjust_genre_counts(db, model, added=(), removed=()):
+    """Apply the genre changes of one venue or artist to GenreCount.
+
+    Runs in the caller's session, so the counts commit or roll back
+    together with the row they describe.
+    """
+    table = db.metadata.tables["GenreCount"]
+    deltas = Counter(added)
+    deltas.subtract(removed)
+    for genre, delta in deltas.items():
+        if not delta:
+            continue
+        if db.engine.dialect.name == "postgresql":
+            statement = postgresql.insert(table).values(
+                kind=model.__tablename__, genre=genre, count=delta
+            )
+            db.session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[table.c.kind, table.c.genre],
+                    set_={"count": table.c.count + statement.excluded.count},
+                )
+            )
+            continue
+        updated = db.session.execute(
+            table.update()
+            .where(table.c.kind == model.__tablename__)
+            .where(table.c.genre == genre)
+            .values(count=table.c.count + delta)
+        )
+        if not updated.rowcount:
+            db.session.execute(
+                table.insert().values(kind=model.__tablename__, genre=genre, count=delta)
+            )
+
+
+def rebuild_genre_counts(db, model):
+    """Recount GenreCount for `model` from scratch, e.g. after a bulk import."""
+    table = db.metadata.tables["GenreCount"]
+    db.session.execute(table.delete().where(table.c.kind == model.__tablename__))
+    if db.engine.dialect.name == "postgresql":
+        genre = func.unnest(model.genres).label("genre")
+        counts = db.session.query(genre, func.count()).group_by("genre").all()
+    else:
+        counts = Counter(
+            genre for (genres,) in db.session.query(model.genres) for genre in genres
+        ).items()
+    rows = [
+        {"kind": model.__tablename__, "genre": genre, "count": count}
+        for genre, count in counts
+    ]
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+
+
+def genre_facets(db, model):
+    """(genre, count) pairs for `model`, most common first."""
+    table = db.metadata.tables["GenreCount"]
+    return db.session.execute(
+        table.select()
+        .with_only_columns([table.c.genre, table.c.count])
+        .where(table.c.kind == model.__tablename__)
+        .where(table.c.count > 0)
+        .order_by(table.c.count.desc(), table.c.genre)
+    ).fetchall()
@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+
+FORMATS = {
+    "full": "EEEE MMMM, d, y 'at' h:mma",
+    "medium": "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def compiled_pattern(locale, format):
+    """Parsed Babel locale and date pattern, resolved once per pair."""
+    # Babel and dateutil are imported on first use to keep startup fast.
+    from babel import Locale
+    from babel.dates import parse_pattern
+
+    return Locale.parse(locale), parse_pattern(FORMATS.get(format, format))
+
+
+def format_datetime(value, format="medium", locale="en_US"):
+    """Jinja `datetime` filter; `format` is a FORMATS name or a CLDR pattern."""
+    locale, pattern = compiled_pattern(locale, format)
+    return pattern.apply(to_datetime(value), locale)
+
+
+def format_datetimes(values, format="medium", locale="en_US"):
+    """Format a whole column of timestamps with one pattern lookup."""
+    locale, pattern = compiled_pattern(locale, format)
+    return [pattern.apply(to_datetime(value), locale) for value in values]
+
+
+def to_datetime(value):
+    """`value` as a naive UTC datetime, as the timestamp columns store it.
+
+    Strings are parsed with dateutil; an offset such as "Z" or "+02:00" is
+    converted to UTC rather than kept, so parsed times always compare.
+    """
+    if not isinstance(value, datetime):
+        import dateutil.parser
+
+        value = dateutil.parser.parse(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
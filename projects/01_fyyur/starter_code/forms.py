@@ -1,7 +1,14 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import (
+    StringField,
+    SelectField,
+    SelectMultipleField,
+    DateTimeField,
+    IntegerField,
+)
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange, Optional
+from scheduling import DEFAULT_DURATION
 
 
 class ShowForm(Form):
@@ -10,6 +17,11 @@ class ShowForm(Form):
     start_time = DateTimeField(
         "start_time", validators=[DataRequired()], default=datetime.today()
     )
+    duration = IntegerField(
+        "duration",
+        validators=[Optional(), NumberRange(min=1)],
+        default=DEFAULT_DURATION,
+    )
 
 
 class VenueForm(Form):
@@ -0,0 +1,62 @@
+import json
+
+from sqlalchemy import String, func, literal
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement, and_, cast, true
+from sqlalchemy.types import JSON, Boolean, TypeDecorator
+
+
+class GenreList(TypeDecorator):
+    """A list of genre names: ARRAY(VARCHAR) on PostgreSQL, JSON elsewhere.
+
+    `column.contains([genre, ...])` keeps meaning "has all these genres" on
+    both: PostgreSQL compiles it to the GIN-indexable `@>`, other databases
+    (the SQLite file the tests use) to a substring test on the JSON text.
+    """
+
+    impl = String
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql.ARRAY(String))
+        return dialect.type_descriptor(JSON())
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else list(value)
+
+    class comparator_factory(TypeDecorator.Comparator):
+        def contains(self, other, **kwargs):
+            return GenresContain(self.expr, other)
+
+
+class GenresContain(ColumnElement):
+    type = Boolean()
+    _is_implicitly_boolean = True
+
+    def __init__(self, column, genres):
+        self.column = column
+        self.genres = list(genres)
+
+
+@compiles(GenresContain, "postgresql")
+def compile_genres_contain_postgresql(element, compiler, **kw):
+    genres = cast(postgresql.array(element.genres), postgresql.ARRAY(String))
+    return compiler.process(element.column.op("@>")(genres), **kw)
+
+
+@compiles(GenresContain)
+def compile_genres_contain(element, compiler, **kw):
+    # Each genre is stored JSON-encoded, quotes included, so its encoding
+    # only occurs in the text as a whole element.
+    if not element.genres:
+        return compiler.process(true(), **kw)
+    return "(%s)" % compiler.process(
+        and_(
+            *[
+                func.instr(element.column, literal(json.dumps(genre), String)) > 0
+                for genre in element.genres
+            ]
+        ),
+        **kw
+    )
@@ -0,0 +1,364 @@
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from formatting import to_datetime
+from scheduling import DEFAULT_DURATION, Scheduler
+
+CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+
+FIELDS = {
+    "Venue": (
+        "id",
+        "name",
+        "city",
+        "state",
+        "address",
+        "phone",
+        "genres",
+        "facebook_link",
+        "website",
+        "image_link",
+        "seeking_talent",
+        "seeking_description",
+    ),
+    "Artist": (
+        "id",
+        "name",
+        "city",
+        "state",
+        "phone",
+        "genres",
+        "facebook_link",
+        "website",
+        "image_link",
+        "seeking_venue",
+        "seeking_description",
+    ),
+    "Show": ("venue_id", "artist_id", "start_time", "duration"),
+}
+REQUIRED = {
+    "Venue": ("name", "city", "state", "address", "phone", "genres", "facebook_link"),
+    "Artist": ("name", "city", "state", "phone", "genres", "facebook_link"),
+    "Show": ("venue_id", "artist_id", "start_time"),
+}
+BOOLEANS = ("seeking_talent", "seeking_venue")
+
+
+class RowError(ValueError):
+    pass
+
+
+class Importer(object):
+    """Streams CSV or NDJSON records into the Fyyur tables in chunks.
+
+    Each chunk is validated, assigned primary keys and written in its own
+    transaction: with COPY on PostgreSQL, or with one executemany INSERT
+    elsewhere. Venue and artist ids and names are kept in memory, so show
+    rows can name their venue and artist (`venue_name`, `artist_name`) or
+    reference them by id without a lookup query per row. Shows that would
+    overlap another show at their venue are found per chunk with
+    `scheduler`, as for the bulk endpoint. A chunk the database refuses is
+    rolled back and reported as rejected, and the import goes on with the
+    next one.
+    """
+
+    def __init__(self, db, chunk_size=CHUNK_SIZE, scheduler=None):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.scheduler = scheduler or Scheduler()
+        self.postgres = db.engine.dialect.name == "postgresql"
+        self.ids = {}
+        self.names = {}
+        self.show_keys = None
+
+    def load(self, table_name, path):
+        """Import one file; returns a report of counts, errors and rows/s."""
+        table = self.db.metadata.tables[table_name]
+        if table_name in ("Venue", "Artist"):
+            self._load_keys(table)
+        else:
+            for name in ("Venue", "Artist"):
+                self._load_keys(self.db.metadata.tables[name])
+            self._load_show_keys(table)
+
+        report = {"table": table_name, "imported": 0, "rejected": 0, "errors": []}
+        started = time.time()
+        records = read_records(path)
+        number = 0
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+            rows, numbers = [], []
+            for record in chunk:
+                number += 1
+                try:
+                    rows.append(self._validate(table_name, record))
+                    numbers.append(number)
+                except RowError as e:
+                    reject(report, "record %d: %s" % (number, e))
+            if table_name == "Show":
+                rows = self._without_overlaps(rows, numbers, report)
+            if not rows:
+                continue
+            try:
+                self._write(table, rows)
+            except (SQLAlchemyError, self.db.engine.dialect.dbapi.Error) as e:
+                self.db.session.rollback()
+                self._forget(table_name, rows)
+                reject(
+                    report,
+                    "records %d-%d: chunk not written: %s"
+                    % (number - len(chunk) + 1, number, first_line(e)),
+                    len(rows),
+                )
+            else:
+                report["imported"] += len(rows)
+                if table_name == "Show":
+                    self.scheduler.added(rows)
+
+        elapsed = max(time.time() - started, 1e-6)
+        report["seconds"] = elapsed
+        report["rows_per_second"] = report["imported"] / elapsed
+        return report
+
+    def _load_keys(self, table):
+        if table.name in self.ids:
+            return
+        ids, names = set(), {}
+        for id, name in self.db.session.execute(
+            table.select().with_only_columns([table.c.id, table.c.name])
+        ):
+            ids.add(id)
+            names[name] = id
+        self.ids[table.name] = ids
+        self.names[table.name] = names
+
+    def _load_show_keys(self, table):
+        """Seed show_keys with the shows already booked, in one query."""
+        if self.show_keys is not None:
+            return
+        self.show_keys = {
+            (venue_id, artist_id)
+            for venue_id, artist_id in self.db.session.execute(
+                table.select().with_only_columns([table.c.venue_id, table.c.artist_id])
+            )
+        }
+
+    def _without_overlaps(self, rows, numbers, report):
+        """`rows` less the shows overlapping a booked show or each other."""
+        overlapping = self.scheduler.conflicts(self.db, rows)
+        for index in sorted(overlapping):
+            row = rows[index]
+            self.show_keys.discard((row["venue_id"], row["artist_id"]))
+            reject(
+                report,
+                "record %d: overlaps another show at venue %d"
+                % (numbers[index], row["venue_id"]),
+            )
+        return [row for index, row in enumerate(rows) if index not in overlapping]
+
+    def _forget(self, table_name, rows):
+        """Drop the keys `_validate` reserved for rows that were not written."""
+        if table_name == "Show":
+            self.show_keys.difference_update(
+                (row["venue_id"], row["artist_id"]) for row in rows
+            )
+        else:
+            self.ids[table_name].difference_update(row["id"] for row in rows)
+
+    def _validate(self, table_name, record):
+        if isinstance(record, RowError):
+            raise record
+        if not isinstance(record, dict):
+            raise RowError("not an object: %r" % (record,))
+        row = {}
+        for field in FIELDS[table_name]:
+            value = record.get(field)
+            if isinstance(value, str):
+                value = value.strip()
+            row[field] = None if value in ("", None) else value
+        if table_name == "Show":
+            self._resolve(row, record, "Venue")
+            self._resolve(row, record, "Artist")
+        missing = [field for field in REQUIRED[table_name] if row[field] is None]
+        if missing:
+            raise RowError("missing " + ", ".join(missing))
+
+        if table_name == "Show":
+            try:
+                row["start_time"] = to_datetime(str(row["start_time"]))
+            except (ValueError, OverflowError):
+                raise RowError("bad start_time %r" % row["start_time"])
+            try:
+                row["duration"] = int(row["duration"] or DEFAULT_DURATION)
+            except (TypeError, ValueError):
+                raise RowError("bad duration %r" % row["duration"])
+            if row["duration"] < 1:
+                raise RowError("bad duration %r" % row["duration"])
+            key = (row["venue_id"], row["artist_id"])
+            if key in self.show_keys:
+                raise RowError("duplicate show for venue %s, artist %s" % key)
+            self.show_keys.add(key)
+            return row
+
+        if row["id"] is not None:
+            try:
+                row["id"] = int(row["id"])
+            except (TypeError, ValueError):
+                raise RowError("bad id %r" % row["id"])
+            if row["id"] in self.ids[table_name]:
+                raise RowError("%s %d already exists" % (table_name, row["id"]))
+            self.ids[table_name].add(row["id"])
+        row["genres"] = parse_genres(row["genres"])
+        for field in BOOLEANS:
+            if field in row:
+                row[field] = parse_bool(row[field])
+        return row
+
+    def _resolve(self, row, record, table_name):
+        """Fill venue_id / artist_id from an id or a name in the record."""
+        prefix = table_name.lower()
+        field = prefix + "_id"
+        name = str(record.get(prefix + "_name") or "").strip()
+        if row[field] is None and name:
+            if name not in self.names[table_name]:
+                raise RowError("unknown %s %r" % (prefix, name))
+            row[field] = self.names[table_name][name]
+        elif row[field] is not None:
+            try:
+                row[field] = int(row[field])
+            except (TypeError, ValueError):
+                raise RowError("bad %s %r" % (field, row[field]))
+            if row[field] not in self.ids[table_name]:
+                raise RowError("unknown %s %d" % (field, row[field]))
+
+    def _write(self, table, rows):
+        explicit_ids = table.name != "Show" and any(row["id"] for row in rows)
+        if table.name != "Show":
+            self._assign_ids(table, rows)
+        if self.postgres:
+            connection = self.db.engine.raw_connection()
+            try:
+                copy_rows(connection, table, rows)
+                connection.commit()
+            finally:
+                connection.close()
+            if explicit_ids:
+                # Keep the id sequence ahead of ids that came from the file.
+                self.db.session.execute(
+                    "SELECT setval(pg_get_serial_sequence('\"%s\"', 'id'), "
+                    '(SELECT MAX(id) FROM "%s"))' % (table.name, table.name)
+                )
+        else:
+            self.db.session.execute(table.insert(), rows)
+        self.db.session.commit()
+        if table.name != "Show":
+            for row in rows:
+                self.ids[table.name].add(row["id"])
+                self.names[table.name][row["name"]] = row["id"]
+
+    def _assign_ids(self, table, rows):
+        pending = [row for row in rows if row["id"] is None]
+        if not pending:
+            return
+        if self.postgres:
+            ids = self.db.session.execute(
+                "SELECT nextval(pg_get_serial_sequence('\"%s\"', 'id')) "
+                "FROM generate_series(1, :n)" % table.name,
+                {"n": len(pending)},
+            ).fetchall()
+            for row, (id,) in zip(pending, ids):
+                row["id"] = id
+        else:
+            next_id = max(self.ids[table.name] | {0}) + 1
+            for row in pending:
+                row["id"] = next_id
+                next_id += 1
+
+
+def reject(report, error, rows=1):
+    report["rejected"] += rows
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append(error)
+
+
+def first_line(error):
+    return str(getattr(error, "orig", None) or error).strip().splitlines()[0]
+
+
+def copy_rows(connection, table, rows):
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+    cursor = connection.cursor()
+    cursor.copy_expert(
+        'COPY "%s" (%s) FROM STDIN WITH (FORMAT csv)'
+        % (table.name, ", ".join(columns)),
+        buffer,
+    )
+    cursor.close()
+
+
+def copy_value(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, list):
+        return "{%s}" % ",".join(
+            '"%s"' % item.replace("\\", "\\\\").replace('"', '\\"') for item in value
+        )
+    return value
+
+
+def read_records(path):
+    """Yield dicts from a .csv file or a newline-delimited JSON file.
+
+    A JSON line that does not parse is yielded as a RowError naming the
+    line, so it is rejected like any other bad record.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline="") as f:
+        if extension == ".csv":
+            for record in csv.DictReader(f):
+                yield record
+        elif extension in (".ndjson", ".jsonl"):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield RowError("line %d: bad JSON: %s" % (line_number, e))
+        else:
+            raise ValueError("unsupported file type %r" % extension)
+
+
+def parse_genres(value):
+    if isinstance(value, list):
+        genres = [str(genre).strip() for genre in value]
+    elif isinstance(value, str):
+        genres = [genre.strip() for genre in value.split(";")]
+    else:
+        raise RowError("bad genres %r" % (value,))
+    genres = [genre for genre in genres if genre]
+    if not genres:
+        raise RowError("missing genres")
+    return genres
+
+
+def parse_bool(value):
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    return str(value).lower() in ("1", "t", "true", "y", "yes")
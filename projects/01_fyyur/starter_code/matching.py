@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import Counter
+
+from flask import current_app
+
+CITY_BOOST = 1.0
+STATE_BOOST = 0.5
+MATCH_LIMIT = 10
+MATCH_INDEX_REBUILD_INTERVAL = 300
+
+# Which flag marks a model's rows as looking for the other side.
+SEEKING = {"Venue": "seeking_talent", "Artist": "seeking_venue"}
+
+
+class MatchIndex(object):
+    """Inverted index from genre to the venues and artists seeking a match.
+
+    A match request counts shared genres by walking only the postings of
+    the requested genres, adds CITY_BOOST for the same city and state (or
+    STATE_BOOST for the same state), and keeps the best MATCH_LIMIT; rows
+    sharing no genre are never looked at. Each model is loaded with one
+    column query on first use and then kept current by `refresh` and
+    `remove` from the write handlers. The index lives in the process, so
+    it is rebuilt every `interval` seconds to take in rows written by
+    other workers or by `flask fyyur-import`. The rebuild runs in a
+    background thread and replaces the index in one assignment; requests
+    keep using the old index until then.
+    """
+
+    def __init__(self, interval=MATCH_INDEX_REBUILD_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._kinds = {}
+        self._rebuilds = {}
+
+    def init_app(self, app):
+        self.interval = app.config.get("MATCH_INDEX_REBUILD_INTERVAL", self.interval)
+
+    def matches(self, db, model, genres, city, state, limit=MATCH_LIMIT):
+        """[(score, entry)] of `model` rows for the given genres and place.
+
+        Each entry is a dict with id, name, city, state and genres.
+        """
+        kind = self._kind(db, model)
+        with self._lock:
+            scores = Counter()
+            for genre in set(genres):
+                scores.update(kind["postings"].get(genre, ()))
+            local = kind["places"].get((city, state), set())
+            for id in local.intersection(scores):
+                scores[id] += CITY_BOOST
+            for id in kind["states"].get(state, set()).intersection(scores):
+                if id not in local:
+                    scores[id] += STATE_BOOST
+            return [
+                (score, kind["entries"][id]) for id, score in scores.most_common(limit)
+            ]
+
+    def refresh(self, db, model, ids):
+        """Re-read rows `ids` of `model` after they were created or edited."""
+        if model.__tablename__ not in self._kinds:
+            return
+        rows = self._query(db, model).filter(model.id.in_(list(ids))).all()
+        with self._lock:
+            kind = self._kinds[model.__tablename__]
+            for id in ids:
+                self._unindex(kind, int(id))
+            for row in rows:
+                self._index(kind, row)
+
+    def remove(self, model, ids):
+        with self._lock:
+            kind = self._kinds.get(model.__tablename__)
+            if kind is not None:
+                for id in ids:
+                    self._unindex(kind, int(id))
+
+    def clear(self):
+        self.wait()
+        with self._lock:
+            self._kinds.clear()
+
+    def wait(self):
+        """Block until the background rebuilds under way have finished."""
+        for thread in list(self._rebuilds.values()):
+            thread.join()
+
+    def _kind(self, db, model):
+        name = model.__tablename__
+        with self._lock:
+            kind = self._kinds.get(name)
+            if kind is not None and (name in self._rebuilds or not self._stale(kind)):
+                return kind
+            if kind is not None:
+                thread = threading.Thread(
+                    target=self._rebuild,
+                    args=(current_app._get_current_object(), db, model),
+                    daemon=True,
+                )
+                self._rebuilds[name] = thread
+                thread.start()
+                return kind
+        return self._build(db, model)
+
+    def _rebuild(self, app, db, model):
+        with app.app_context():
+            try:
+                self._build(db, model)
+            except Exception:
+                app.logger.exception("rebuilding %s matches failed", model.__name__)
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._rebuilds.pop(model.__tablename__, None)
+
+    def _build(self, db, model):
+        """Index the seeking rows of `model` and swap the result in."""
+        kind = {"postings": {}, "places": {}, "states": {}, "entries": {}}
+        kind["loaded_at"] = time.time()
+        for row in self._query(db, model).all():
+            self._index(kind, row)
+        with self._lock:
+            self._kinds[model.__tablename__] = kind
+        return kind
+
+    def _stale(self, kind):
+        return time.time() - kind["loaded_at"] > self.interval
+
+    def _query(self, db, model):
+        return db.session.query(
+            model.id, model.name, model.genres, model.city, model.state
+        ).filter(getattr(model, SEEKING[model.__tablename__]))
+
+    def _index(self, kind, row):
+        kind["entries"][row.id] = {
+            "id": row.id,
+            "name": row.name,
+            "city": row.city,
+            "state": row.state,
+            "genres": list(row.genres),
+        }
+        for genre in set(row.genres):
+            kind["postings"].setdefault(genre, set()).add(row.id)
+        kind["places"].setdefault((row.city, row.state), set()).add(row.id)
+        kind["states"].setdefault(row.state, set()).add(row.id)
+
+    def _unindex(self, kind, id):
+        entry = kind["entries"].pop(id, None)
+        if entry is None:
+            return
+        for genre in entry["genres"]:
+            kind["postings"].get(genre, set()).discard(id)
+        kind["places"].get((entry["city"], entry["state"]), set()).discard(id)
+        kind["states"].get(entry["state"], set()).discard(id)
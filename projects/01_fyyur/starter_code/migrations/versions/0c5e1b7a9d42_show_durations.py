@@ -0,0 +1,41 @@
+"""show durations and no overlapping shows per venue
+
+Revision ID: 0c5e1b7a9d42
+Revises: dee2e2237d32
+Create Date: 2020-06-01 09:12:44.208316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c5e1b7a9d42'
+down_revision = 'dee2e2237d32'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('duration', sa.Integer(),
+                                    server_default='120', nullable=False))
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # The constraint's GiST index answers "does this venue have a show
+    # overlapping this period" in logarithmic time, and rejects overlaps
+    # written by concurrent requests. Existing overlapping shows must be
+    # resolved before this runs. start_time is a timestamp without time
+    # zone, hence tsrange.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute(
+        'ALTER TABLE "Show" ADD CONSTRAINT show_no_overlap '
+        'EXCLUDE USING gist (venue_id WITH =, '
+        "tsrange(start_time, start_time + duration * interval '1 minute') "
+        'WITH &&)'
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE "Show" DROP CONSTRAINT show_no_overlap')
+    op.drop_column('Show', 'duration')
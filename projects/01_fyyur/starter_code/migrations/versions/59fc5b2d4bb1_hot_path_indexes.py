@@ -0,0 +1,71 @@
+"""hot path indexes
+
+Revision ID: 59fc5b2d4bb1
+Revises: e5bd006fab7a
+Create Date: 2020-05-09 11:03:52.614807
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '59fc5b2d4bb1'
+down_revision = 'e5bd006fab7a'
+branch_labels = None
+depends_on = None
+
+BTREE_INDEXES = (
+    ('ix_show_start_time', 'Show', ['start_time']),
+    ('ix_show_artist_id', 'Show', ['artist_id']),
+    ('ix_venue_city_state', 'Venue', ['city', 'state']),
+)
+GIN_INDEXES = (
+    ('ix_venue_genres', 'Venue', ['genres']),
+    ('ix_artist_genres', 'Artist', ['genres']),
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        for name, table, columns in BTREE_INDEXES:
+            op.create_index(name, table, columns)
+        return
+
+    # dda2214f9093 created genres as VARCHAR while the models map an ARRAY,
+    # so existing rows hold array literals such as '{Jazz,Folk}'. Convert
+    # them to real arrays before they can carry a GIN index.
+    inspector = sa.inspect(bind)
+    for table in ('Venue', 'Artist'):
+        columns = {c['name']: c['type'] for c in inspector.get_columns(table)}
+        if not isinstance(columns['genres'], postgresql.ARRAY):
+            op.alter_column(
+                table, 'genres',
+                type_=postgresql.ARRAY(sa.String()),
+                postgresql_using='genres::varchar[]',
+            )
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block, and
+    # builds the index without holding a write lock on a live table.
+    with op.get_context().autocommit_block():
+        for name, table, columns in BTREE_INDEXES:
+            op.create_index(name, table, columns,
+                            postgresql_concurrently=True)
+        for name, table, columns in GIN_INDEXES:
+            op.create_index(name, table, columns, postgresql_using='gin',
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        for name, table, columns in BTREE_INDEXES:
+            op.drop_index(name, table_name=table)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in BTREE_INDEXES + GIN_INDEXES:
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True)
@@ -0,0 +1,40 @@
+"""delete shows with their venue or artist
+
+Revision ID: 5a1f0c9e7b21
+Revises: 0c5e1b7a9d42
+Create Date: 2020-06-02 14:27:05.913482
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a1f0c9e7b21'
+down_revision = '0c5e1b7a9d42'
+branch_labels = None
+depends_on = None
+
+# The initial migration left these constraints to PostgreSQL's default
+# names.
+CONSTRAINTS = (
+    ('Show_venue_id_fkey', 'Venue', 'venue_id'),
+    ('Show_artist_id_fkey', 'Artist', 'artist_id'),
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name, referent, column in CONSTRAINTS:
+        op.drop_constraint(name, 'Show', type_='foreignkey')
+        op.create_foreign_key(name, 'Show', referent, [column], ['id'],
+                              ondelete='CASCADE')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name, referent, column in CONSTRAINTS:
+        op.drop_constraint(name, 'Show', type_='foreignkey')
+        op.create_foreign_key(name, 'Show', referent, [column], ['id'])
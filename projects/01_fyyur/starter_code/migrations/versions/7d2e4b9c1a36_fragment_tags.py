@@ -0,0 +1,28 @@
+"""fragment cache tag generations
+
+Revision ID: 7d2e4b9c1a36
+Revises: 5a1f0c9e7b21
+Create Date: 2020-06-04 10:41:52.317604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2e4b9c1a36'
+down_revision = '5a1f0c9e7b21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('FragmentTag',
+    sa.Column('tag', sa.String(length=120), nullable=False),
+    sa.Column('generation', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('tag')
+    )
+
+
+def downgrade():
+    op.drop_table('FragmentTag')
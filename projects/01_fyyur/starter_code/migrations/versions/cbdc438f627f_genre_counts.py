@@ -0,0 +1,40 @@
+"""genre counts
+
+Revision ID: cbdc438f627f
+Revises: def6226ac908
+Create Date: 2020-05-23 15:12:09.874215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cbdc438f627f'
+down_revision = 'def6226ac908'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('GenreCount',
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('genre', sa.String(length=120), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'genre')
+    )
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # Backfill from the existing rows; the app keeps the counts current
+    # from here on (see facets.py).
+    for table in ('Venue', 'Artist'):
+        op.execute(
+            'INSERT INTO "GenreCount" (kind, genre, count) '
+            "SELECT '{0}', genre, count(*) "
+            'FROM "{0}", unnest("{0}".genres) AS genre '
+            'GROUP BY genre'.format(table)
+        )
+
+
+def downgrade():
+    op.drop_table('GenreCount')
@@ -0,0 +1,30 @@
+"""updated_at columns
+
+Revision ID: dee2e2237d32
+Revises: cbdc438f627f
+Create Date: 2020-05-30 10:48:31.562870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dee2e2237d32'
+down_revision = 'cbdc438f627f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # now() is stable, so PostgreSQL 11+ stores the default once instead of
+    # rewriting the tables.
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(),
+                                       server_default=sa.func.now(),
+                                       nullable=False))
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        op.drop_column(table, 'updated_at')
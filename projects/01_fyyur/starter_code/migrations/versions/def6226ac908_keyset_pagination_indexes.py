@@ -0,0 +1,45 @@
+"""keyset pagination indexes
+
+Revision ID: def6226ac908
+Revises: 59fc5b2d4bb1
+Create Date: 2020-05-16 09:27:44.305118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'def6226ac908'
+down_revision = '59fc5b2d4bb1'
+branch_labels = None
+depends_on = None
+
+# Each index matches the ORDER BY and row-value comparison of a listing
+# in pagination.keyset_page, so any page is a single index range scan.
+KEYSET_INDEXES = (
+    ('ix_show_keyset', 'Show', ['start_time', 'venue_id', 'artist_id']),
+    ('ix_venue_name_id', 'Venue', ['name', 'id']),
+    ('ix_artist_name_id', 'Artist', ['name', 'id']),
+)
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, table, columns in KEYSET_INDEXES:
+            op.create_index(name, table, columns,
+                            postgresql_concurrently=postgres)
+        # ix_show_keyset leads with start_time and replaces this index.
+        op.drop_index('ix_show_start_time', table_name='Show',
+                      postgresql_concurrently=postgres)
+
+
+def downgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        op.create_index('ix_show_start_time', 'Show', ['start_time'],
+                        postgresql_concurrently=postgres)
+        for name, table, columns in KEYSET_INDEXES:
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=postgres)
@@ -0,0 +1,47 @@
+"""search trigram indexes
+
+Revision ID: e5bd006fab7a
+Revises: dda2214f9093
+Create Date: 2020-05-02 18:41:07.120934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5bd006fab7a'
+down_revision = 'dda2214f9093'
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = {
+    'Venue': ('name', 'city', 'state'),
+    'Artist': ('name', 'city', 'state'),
+}
+
+
+def upgrade():
+    # pg_trgm GIN indexes answer the ILIKE '%term%' filters in search.py
+    # without a sequential scan. Other backends keep the plain scan.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, columns in SEARCH_COLUMNS.items():
+        for column in columns:
+            op.create_index(
+                'ix_{}_{}_trgm'.format(table.lower(), column),
+                table,
+                [column],
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'},
+            )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, columns in SEARCH_COLUMNS.items():
+        for column in columns:
+            op.drop_index('ix_{}_{}_trgm'.format(table.lower(), column),
+                          table_name=table)
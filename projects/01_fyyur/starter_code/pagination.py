@@ -0,0 +1,80 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import DateTime, tuple_
+
+PAGE_SIZE = 50
+
+
+class Page(object):
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def keyset_page(query, columns, after=None, before=None, per_page=PAGE_SIZE):
+    """One page of `query` ordered by `columns`, positioned by a cursor.
+
+    `columns` must uniquely order the rows (end with a primary key). Pages
+    are found with a row-value comparison against the cursor rather than
+    an OFFSET, so with an index on `columns` a deep page costs the same as
+    the first one. The cursors in the returned Page are opaque strings for
+    the `after` and `before` query arguments. Raises ValueError for a
+    cursor that cannot be decoded.
+    """
+    rows = keyset_query(query, columns, after, before, per_page).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before is not None:
+        rows.reverse()
+    if not rows:
+        return Page(rows)
+
+    first, last = cursor_for(rows[0], columns), cursor_for(rows[-1], columns)
+    if before is not None:
+        return Page(rows, next_cursor=last, prev_cursor=first if has_more else None)
+    return Page(
+        rows,
+        next_cursor=last if has_more else None,
+        prev_cursor=first if after is not None else None,
+    )
+
+
+def keyset_query(query, columns, after=None, before=None, per_page=PAGE_SIZE):
+    """The statement keyset_page runs: one page of rows, plus one to peek."""
+    key = tuple_(*columns)
+    if before is not None:
+        query = query.filter(key < tuple_(*decode_cursor(before, columns)))
+        query = query.order_by(*[column.desc() for column in columns])
+    else:
+        if after is not None:
+            query = query.filter(key > tuple_(*decode_cursor(after, columns)))
+        query = query.order_by(*columns)
+    return query.limit(per_page + 1)
+
+
+def cursor_for(row, columns):
+    return encode_cursor([getattr(row, column.key) for column in columns])
+
+
+def encode_cursor(values):
+    values = [
+        value.isoformat() if isinstance(value, datetime) else value for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor does not match the page key")
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (TypeError, ValueError) as e:
+        raise ValueError("invalid cursor: %s" % e)
@@ -0,0 +1,187 @@
+import random
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import event, orm
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.pool import QueuePool, StaticPool
+
+POOL_SIZING_OPTIONS = ("pool_size", "max_overflow", "pool_timeout")
+
+
+class PoolMetrics(object):
+    """Connection checkout wait times per pool, in seconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def observe(self, pool, seconds):
+        with self._lock:
+            stats = self._pools.setdefault(pool, {"count": 0, "sum": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["sum"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {pool: dict(stats) for pool, stats in self._pools.items()}
+
+    def render(self):
+        """Prometheus text exposition of the collected wait times."""
+        lines = [
+            "# HELP fyyur_db_pool_checkout_wait_seconds Time spent waiting for "
+            "a pooled database connection.",
+            "# TYPE fyyur_db_pool_checkout_wait_seconds summary",
+        ]
+        for pool, stats in sorted(self.snapshot().items()):
+            for suffix in ("count", "sum", "max"):
+                lines.append(
+                    'fyyur_db_pool_checkout_wait_seconds_%s{pool="%s"} %s'
+                    % (suffix, pool, stats[suffix])
+                )
+        return "\n".join(lines) + "\n"
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited to pool_metrics."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        finally:
+            pool_metrics.observe(self.logging_name, time.perf_counter() - started)
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends the queries of read-only views to a replica.
+
+    Views marked with @replica_reads read from one replica, picked once
+    per request, until the session writes. Everything else, including CLI
+    commands, flushes, INSERT/UPDATE/DELETE statements, and requests
+    arriving within SQLALCHEMY_REPLICA_STICKY_SECONDS of a write by the
+    same client, uses the primary so that clients read their own writes
+    despite replica lag.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super(RoutingSession, self).__init__(db, **options)
+
+    def execute(self, clause, *args, **kwargs):
+        if isinstance(clause, UpdateBase):
+            mark_write(self.app)
+        return super(RoutingSession, self).execute(clause, *args, **kwargs)
+
+    def get_bind(self, mapper=None, clause=None):
+        if (
+            self._flushing
+            or isinstance(clause, UpdateBase)
+            or not reads_from_replica()
+        ):
+            return super(RoutingSession, self).get_bind(mapper, clause)
+        replicas = self.db.replica_engines(self.app)
+        if not replicas:
+            return super(RoutingSession, self).get_bind(mapper, clause)
+        if "replica_engine" not in g:
+            g.replica_engine = random.choice(replicas)
+        return g.replica_engine
+
+
+def replica_reads(view):
+    """Mark a view as read-only, so its queries may go to a replica.
+
+    Routing is decided per view rather than per HTTP method: a search form
+    POSTs without writing, and a GET is not read-only just by its method.
+    """
+    view.replica_reads = True
+    return view
+
+
+def reads_from_replica():
+    if not has_request_context() or request.endpoint is None:
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    if not getattr(view, "replica_reads", False):
+        return False
+    if g.get("wrote_to_primary"):
+        return False
+    return session.get("read_primary_until", 0) < time.time()
+
+
+def mark_write(app):
+    if has_request_context():
+        g.wrote_to_primary = True
+        session["read_primary_until"] = time.time() + app.config.get(
+            "SQLALCHEMY_REPLICA_STICKY_SECONDS", 5
+        )
+
+
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy with timed, config-sized pools and read replica routing.
+
+    Pools are sized by SQLALCHEMY_ENGINE_OPTIONS; replicas are listed in
+    SQLALCHEMY_REPLICA_URIS and share those options.
+    """
+
+    _replica_lock = threading.Lock()
+
+    def create_session(self, options):
+        sessionmaker = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+        @event.listens_for(sessionmaker, "after_flush")
+        def after_flush(db_session, flush_context):
+            mark_write(db_session.app)
+
+        return sessionmaker
+
+    def create_engine(self, sa_url, engine_opts):
+        if engine_opts.get("poolclass") is StaticPool:
+            # In-memory SQLite keeps a single connection; nothing to size.
+            for option in POOL_SIZING_OPTIONS:
+                engine_opts.pop(option, None)
+        else:
+            engine_opts["poolclass"] = TimedQueuePool
+            engine_opts.setdefault("pool_logging_name", "primary")
+            if sa_url.drivername.startswith("sqlite"):
+                engine_opts.setdefault("connect_args", {})["check_same_thread"] = False
+        engine = super(RoutingSQLAlchemy, self).create_engine(sa_url, engine_opts)
+        if sa_url.drivername.startswith("sqlite"):
+            # SQLite ignores ON DELETE CASCADE unless asked per connection.
+            event.listen(engine, "connect", enable_sqlite_foreign_keys)
+        return engine
+
+    def replica_engines(self, app=None):
+        app = self.get_app(app)
+        state = get_state(app)
+        with self._replica_lock:
+            if not hasattr(state, "replica_engines"):
+                state.replica_engines = [
+                    self._create_replica(app, uri, "replica%d" % number)
+                    for number, uri in enumerate(
+                        app.config.get("SQLALCHEMY_REPLICA_URIS", ())
+                    )
+                ]
+            return state.replica_engines
+
+    def _create_replica(self, app, uri, name):
+        sa_url = make_url(uri)
+        options = {}
+        self.apply_pool_defaults(app, options)
+        self.apply_driver_hacks(app, sa_url, options)
+        options.update(app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+        options["pool_logging_name"] = name
+        return self.create_engine(sa_url, options)
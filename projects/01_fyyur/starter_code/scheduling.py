@@ -0,0 +1,147 @@
+import threading
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from sqlalchemy import text
+
+DEFAULT_DURATION = 120
+
+# Must match the expression of the show_no_overlap exclusion constraint
+# (migration 0c5e1b7a9d42) for PostgreSQL to probe its GiST index.
+SHOW_PERIOD_SQL = (
+    "tsrange(\"Show\".start_time, "
+    "\"Show\".start_time + \"Show\".duration * interval '1 minute')"
+)
+
+
+def show_period(show):
+    start = show["start_time"]
+    return start, start + timedelta(minutes=show.get("duration") or DEFAULT_DURATION)
+
+
+class VenueCalendar(object):
+    """The shows of one venue as sorted, non-overlapping [start, end) periods.
+
+    Because no two periods overlap, the only one that can overlap a new
+    period is the last one starting before it ends, so a check is a single
+    binary search.
+    """
+
+    def __init__(self, periods=()):
+        self.periods = sorted(periods)
+
+    def overlaps(self, start, end):
+        index = bisect_left(self.periods, (end,))
+        return index > 0 and self.periods[index - 1][1] > start
+
+    def add(self, start, end):
+        insort(self.periods, (start, end))
+
+
+class Scheduler(object):
+    """Detects shows that would overlap another show at the same venue.
+
+    On PostgreSQL the check is one query against the GiST index behind the
+    show_no_overlap exclusion constraint, which also rejects any conflict
+    that slips in between check and insert. Other databases have no such
+    constraint, so each venue's shows are loaded once into a VenueCalendar
+    and kept current through `added` and `forget`; that suits the single
+    process development server, not several workers sharing one database.
+    """
+
+    def __init__(self):
+        self._calendars = {}
+        self._lock = threading.Lock()
+
+    def conflicts(self, db, shows):
+        """Indexes of `shows` that overlap a booked show or an earlier one.
+
+        Each show is a dict with venue_id, start_time and optional duration
+        in minutes.
+        """
+        if not shows:
+            return set()
+        if db.engine.dialect.name == "postgresql":
+            conflicts = self._booked_conflicts_postgres(db, shows)
+        else:
+            conflicts = self._booked_conflicts_in_memory(db, shows)
+
+        batch = {}
+        for index, show in enumerate(shows):
+            if index in conflicts:
+                continue
+            calendar = batch.setdefault(show["venue_id"], VenueCalendar())
+            start, end = show_period(show)
+            if calendar.overlaps(start, end):
+                conflicts.add(index)
+            else:
+                calendar.add(start, end)
+        return conflicts
+
+    def added(self, shows):
+        with self._lock:
+            for show in shows:
+                calendar = self._calendars.get(show["venue_id"])
+                if calendar is not None:
+                    calendar.add(*show_period(show))
+
+    def forget(self, *venue_ids):
+        with self._lock:
+            for venue_id in venue_ids:
+                self._calendars.pop(int(venue_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._calendars.clear()
+
+    def _booked_conflicts_postgres(self, db, shows):
+        rows, params = [], {}
+        for index, show in enumerate(shows):
+            start, end = show_period(show)
+            rows.append("(:i%d, :v%d, :s%d, :e%d)" % (index, index, index, index))
+            params.update(
+                {
+                    "i%d" % index: index,
+                    "v%d" % index: show["venue_id"],
+                    "s%d" % index: start,
+                    "e%d" % index: end,
+                }
+            )
+        sql = (
+            "SELECT DISTINCT candidate.idx FROM (VALUES %s) "
+            "AS candidate(idx, venue_id, start_time, end_time) "
+            'JOIN "Show" ON "Show".venue_id = candidate.venue_id '
+            "AND %s && tsrange(candidate.start_time, candidate.end_time)"
+            % (", ".join(rows), SHOW_PERIOD_SQL)
+        )
+        return {index for (index,) in db.session.execute(text(sql), params)}
+
+    def _booked_conflicts_in_memory(self, db, shows):
+        calendars = self._load_calendars(db, {show["venue_id"] for show in shows})
+        return {
+            index
+            for index, show in enumerate(shows)
+            if calendars[show["venue_id"]].overlaps(*show_period(show))
+        }
+
+    def _load_calendars(self, db, venue_ids):
+        """{venue_id: VenueCalendar}, loading the missing ones in one query."""
+        with self._lock:
+            missing = [id for id in venue_ids if id not in self._calendars]
+            if missing:
+                table = db.metadata.tables["Show"]
+                periods = {id: [] for id in missing}
+                rows = db.session.execute(
+                    table.select()
+                    .with_only_columns(
+                        [table.c.venue_id, table.c.start_time, table.c.duration]
+                    )
+                    .where(table.c.venue_id.in_(missing))
+                )
+                for venue_id, start, duration in rows:
+                    periods[venue_id].append(
+                        show_period({"start_time": start, "duration": duration})
+                    )
+                for id in missing:
+                    self._calendars[id] = VenueCalendar(periods[id])
+            return {id: self._calendars[id] for id in venue_ids}
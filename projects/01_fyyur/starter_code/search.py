@@ -0,0 +1,57 @@
+from sqlalchemy import func, or_
+
+RESULTS_PER_PAGE = 20
+
+
+def search(db, model, term, page=1, per_page=RESULTS_PER_PAGE, genre=None):
+    """Case-insensitive substring search over name, city and state.
+
+    On PostgreSQL the three columns carry pg_trgm GIN indexes (migration
+    e5bd006fab7a), so the ILIKE filter is served from the index and results
+    are ranked by trigram similarity to the term. Other databases, such as
+    the in-memory SQLite database of test_app.py, fall back to a scan
+    ordered by name. `genre` narrows the results with the GIN-indexed
+    genres array. Returns the dict the search templates expect.
+    """
+    page = max(page, 1)
+    query = search_query(db, model, term, genre)
+    count = query.count()
+    data = search_page_query(db, model, query, term, page, per_page).all()
+
+    return {
+        "count": count,
+        "data": data,
+        "page": page,
+        "pages": max((count + per_page - 1) // per_page, 1),
+    }
+
+
+def search_query(db, model, term, genre=None):
+    """`model` rows matching `term` (and `genre`), unordered."""
+    pattern = "%{}%".format(escape_like(term))
+    query = db.session.query(model.id, model.name).filter(
+        or_(*[column.ilike(pattern, escape="\\") for column in search_columns(model)])
+    )
+    if genre:
+        query = query.filter(model.genres.contains([genre]))
+    return query
+
+
+def search_page_query(db, model, query, term, page=1, per_page=RESULTS_PER_PAGE):
+    """One ranked page of a search_query."""
+    if db.engine.dialect.name == "postgresql" and term:
+        rank = func.greatest(
+            *[func.similarity(column, term) for column in search_columns(model)]
+        )
+        query = query.order_by(rank.desc(), model.id)
+    else:
+        query = query.order_by(model.name, model.id)
+    return query.limit(per_page).offset((max(page, 1) - 1) * per_page)
+
+
+def search_columns(model):
+    return (model.name, model.city, model.state)
+
+
+def escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
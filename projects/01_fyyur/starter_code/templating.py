@@ -0,0 +1,93 @@
+import os
+import stat
+import tempfile
+import time
+
+import click
+from jinja2 import FileSystemBytecodeCache
+
+
+class AtomicFileSystemBytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache that can be shared by concurrent workers.
+
+    Jinja 2 writes cache files in place, so a worker starting while
+    another is writing may load a truncated file. Here each file is
+    written under a temporary name and renamed over the old one.
+    """
+
+    def dump_bytecode(self, bucket):
+        filename = self._get_cache_filename(bucket)
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                bucket.write_bytecode(f)
+            os.replace(temporary, filename)
+        except BaseException:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            raise
+
+
+def private_directory(directory):
+    """Create `directory` for this user only, or check that it already is.
+
+    Jinja runs whatever bytecode it finds in its cache, so a directory
+    another user can write to would let them run code in the app.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return
+    info = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+    ):
+        raise RuntimeError(
+            "Template cache directory %r must be owned and writable only by "
+            "the user running the app" % directory
+        )
+
+
+class TemplateCache(object):
+    """Compiled templates that survive restarts and are ready at boot.
+
+    With JINJA_BYTECODE_CACHE on, compiled templates are stored on disk
+    and reused by every worker and restart until the template source
+    changes: in JINJA_BYTECODE_CACHE_DIR, which must belong to the app's
+    user, or else in Jinja's own private per-user directory. `warm_up`
+    compiles every template up front so no request pays for it; call it
+    once filters are registered, since compiling checks that they exist.
+    Under gunicorn --preload the master warms up once and the forked
+    workers share the result. CLI commands other than `flask run` render
+    nothing, so they skip it.
+    """
+
+    def init_app(self, app):
+        if not app.config.get("JINJA_BYTECODE_CACHE"):
+            return
+        directory = app.config.get("JINJA_BYTECODE_CACHE_DIR")
+        if directory:
+            private_directory(directory)
+        app.jinja_env.bytecode_cache = AtomicFileSystemBytecodeCache(directory)
+
+    def warm_up(self, app):
+        if not app.config.get("JINJA_WARM_UP") or not serving():
+            return
+        started = time.perf_counter()
+        names = app.jinja_env.list_templates(extensions=("html",))
+        for name in names:
+            app.jinja_env.get_template(name)
+        app.logger.info(
+            "compiled %d templates in %.0f ms",
+            len(names),
+            (time.perf_counter() - started) * 1000,
+        )
+
+
+def serving():
+    """False while the app is created for a CLI command other than `run`."""
+    context = click.get_current_context(silent=True)
+    return context is None or context.command.name == "run"
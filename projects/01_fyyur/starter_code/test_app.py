@@ -0,0 +1,536 @@
+import os
+import re
+import tempfile
+import unittest
+from datetime import datetime
+
+from app import (
+    Artist,
+    GenreCount,
+    Show,
+    Venue,
+    create_app,
+    db,
+    fragment_cache,
+    match_index,
+    scheduler,
+)
+from cache import TagGenerations
+
+# An in-memory SQLite database: the models keep working off PostgreSQL,
+# with a scan where PostgreSQL would use its trigram and GIN indexes.
+TEST_CONFIG = {
+    "TESTING": True,
+    "WTF_CSRF_ENABLED": False,
+    "SQLALCHEMY_DATABASE_URI": "sqlite://",
+    "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+    "SQLALCHEMY_REPLICA_URIS": [],
+    "LISTING_PAGE_SIZE": 2,
+    "JINJA_BYTECODE_CACHE": False,
+    "JINJA_WARM_UP": False,
+    "FRAGMENT_TAG_CHECK_INTERVAL": 0,
+}
+
+
+class FyyurTestCase(unittest.TestCase):
+    """Fyyur's routes against a fresh database per test."""
+
+    def setUp(self):
+        self.app = create_app(test_config=TEST_CONFIG)
+        self.client = self.app.test_client
+        fragment_cache.clear()
+        scheduler.clear()
+        match_index.clear()
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add(self, *rows):
+        with self.app.app_context():
+            db.session.add_all(rows)
+            db.session.commit()
+            return [row.id for row in rows if hasattr(row, "id")]
+
+    def venue(self, name, genres=("Jazz",), city="San Francisco", state="CA"):
+        return Venue(
+            name=name,
+            genres=list(genres),
+            city=city,
+            state=state,
+            address="1 Main St",
+            phone="555-0100",
+            facebook_link="https://www.facebook.com/%s" % name,
+        )
+
+    def artist(self, name, genres=("Jazz",), city="San Francisco", state="CA"):
+        return Artist(
+            name=name,
+            genres=list(genres),
+            city=city,
+            state=state,
+            phone="555-0100",
+            facebook_link="https://www.facebook.com/%s" % name,
+        )
+
+    def count(self, model):
+        with self.app.app_context():
+            return db.session.query(model).count()
+
+    def queries(self, res):
+        """Statements the request ran, from its Server-Timing header."""
+        timing = res.headers["Server-Timing"]
+        return int(re.search(r'desc="(\d+) queries"', timing).group(1))
+
+    def test_search_venues(self):
+        self.add(self.venue("The Jazz Cellar"), self.venue("Rock Hall", ["Rock"]))
+
+        res = self.client().post("/venues/search", data={"search_term": "jazz"})
+        html = res.get_data(as_text=True)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("The Jazz Cellar", html)
+        self.assertNotIn("Rock Hall", html)
+
+    def test_navbar_marks_current_page(self):
+        html = self.client().get("/venues").get_data(as_text=True)
+
+        self.assertIn('action="/venues/search"', html)
+        self.assertNotIn('action="/artists/search"', html)
+        self.assertRegex(html, r'<li\s+class="active"\s*>\s*<a href="/venues">')
+
+    def test_venues_query_count(self):
+        self.add(self.venue("Blue Note"), self.venue("Cafe Du Nord"))
+        one_area = self.client().get("/venues")
+        fragment_cache.clear()
+        self.add(
+            self.venue("Ashkenaz", city="Berkeley"),
+            self.venue("Bimbo's", city="Oakland"),
+        )
+
+        two_areas = self.client().get("/venues")
+
+        self.assertIn("Berkeley", two_areas.get_data(as_text=True))
+        self.assertIn("Oakland", two_areas.get_data(as_text=True))
+        self.assertGreater(self.queries(one_area), 0)
+        self.assertEqual(self.queries(two_areas), self.queries(one_area))
+
+    def test_detail_query_count(self):
+        venue_id, = self.add(self.venue("Blue Note"))
+        artist_ids = self.add(
+            *[self.artist(name) for name in ("Etta", "Nina", "Sarah")]
+        )
+        self.add(
+            Show(
+                venue_id=venue_id,
+                artist_id=artist_ids[0],
+                start_time=datetime(2035, 5, 1, 20),
+            )
+        )
+        one_show = self.client().get("/venues/%d" % venue_id)
+        fragment_cache.clear()
+        self.add(
+            Show(
+                venue_id=venue_id,
+                artist_id=artist_ids[1],
+                start_time=datetime(2000, 5, 1, 20),
+            ),
+            Show(
+                venue_id=venue_id,
+                artist_id=artist_ids[2],
+                start_time=datetime(2035, 6, 1, 20),
+            ),
+        )
+
+        three_shows = self.client().get("/venues/%d" % venue_id)
+
+        self.assertIn("Nina", three_shows.get_data(as_text=True))
+        self.assertIn("Sarah", three_shows.get_data(as_text=True))
+        self.assertGreater(self.queries(one_show), 0)
+        self.assertEqual(self.queries(three_shows), self.queries(one_show))
+
+    def test_search_escapes_wildcards(self):
+        self.add(self.venue("100% Jazz"), self.venue("1000 Jazz"))
+
+        venues = self.client().post("/venues/search", data={"search_term": "0%"})
+
+        self.assertIn("100% Jazz", venues.get_data(as_text=True))
+        self.assertNotIn("1000 Jazz", venues.get_data(as_text=True))
+
+    def test_search_by_genre(self):
+        self.add(self.venue("Blue Note"), self.venue("Blue Room", ["Rock"]))
+
+        res = self.client().post(
+            "/venues/search", data={"search_term": "blue", "genre": "Rock"}
+        )
+        html = res.get_data(as_text=True)
+
+        self.assertIn("Blue Room", html)
+        self.assertNotIn("Blue Note", html)
+
+    def test_keyset_paging(self):
+        self.add(*[self.artist("Artist %d" % number) for number in range(5)])
+
+        names, cursor = [], None
+        for _ in range(3):
+            url = "/api/v1/artists" + ("?after=%s" % cursor if cursor else "")
+            data = self.client().get(url).get_json()
+            names.extend(artist["name"] for artist in data["data"])
+            cursor = data["next_cursor"]
+
+        self.assertEqual(names, ["Artist %d" % number for number in range(5)])
+        self.assertIsNone(cursor)
+        previous = self.client().get("/api/v1/artists?before=%s" % data["prev_cursor"])
+        self.assertEqual(
+            [artist["name"] for artist in previous.get_json()["data"]],
+            ["Artist 2", "Artist 3"],
+        )
+
+    def test_api_etag(self):
+        venue_id, = self.add(self.venue("Blue Note"))
+        artist_id, = self.add(self.artist("One"))
+        self.add(
+            Show(
+                venue_id=venue_id,
+                artist_id=artist_id,
+                start_time=datetime(2035, 5, 1, 20),
+            )
+        )
+        url = "/api/v1/venues/%d" % venue_id
+        first = self.client().get(url)
+        etag = first.headers["ETag"]
+
+        cached = self.client().get(url, headers={"If-None-Match": etag})
+        self.client().post(
+            "/venues/%d/edit" % venue_id,
+            data={
+                "name": "Blue Note Jazz Club",
+                "city": "San Francisco",
+                "state": "CA",
+                "address": "1 Main St",
+                "phone": "555-0100",
+                "facebook_link": "https://www.facebook.com/bluenote",
+                "genres": ["Jazz"],
+            },
+        )
+        edited = self.client().get(url, headers={"If-None-Match": etag})
+
+        self.assertEqual(
+            sorted(first.get_json()["upcoming_shows"][0]),
+            ["artist_id", "artist_image_link", "artist_name", "start_time"],
+        )
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(edited.status_code, 200)
+        self.assertNotEqual(edited.headers["ETag"], etag)
+        self.assertEqual(edited.get_json()["name"], "Blue Note Jazz Club")
+
+    def test_keyset_paging_invalid_cursor(self):
+        res = self.client().get("/artists?after=not-a-cursor")
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_cache_invalidated_by_other_worker(self):
+        self.add(self.venue("Blue Note"))
+        self.client().get("/venues")
+        self.add(self.venue("Late Night"))
+        cached = self.client().get("/venues").get_data(as_text=True)
+
+        # Another worker handled the write: only the shared counter moves.
+        with self.app.app_context():
+            TagGenerations(db).bump(["Venue"])
+        res = self.client().get("/venues").get_data(as_text=True)
+
+        self.assertNotIn("Late Night", cached)
+        self.assertIn("Late Night", res)
+
+    def test_cache_hit_without_queries(self):
+        self.add(self.venue("Blue Note"))
+        fragment_cache.generations.interval = 60
+        self.addCleanup(setattr, fragment_cache.generations, "interval", 0)
+        self.client().get("/venues")
+
+        res = self.client().get("/venues")
+
+        self.assertIn("Blue Note", res.get_data(as_text=True))
+        self.assertEqual(self.queries(res), 0)
+
+    def test_streamed_page_over_cache_budget(self):
+        venue_id, = self.add(self.venue("Blue Note"))
+        artist_id, = self.add(self.artist("One"))
+        self.add(
+            Show(
+                venue_id=venue_id,
+                artist_id=artist_id,
+                start_time=datetime(2035, 5, 1, 20),
+            )
+        )
+        self.addCleanup(setattr, fragment_cache, "max_bytes", fragment_cache.max_bytes)
+        fragment_cache.max_bytes = 100
+
+        res = self.client().get("/shows")
+
+        self.assertIn("Blue Note", res.get_data(as_text=True))
+        self.assertEqual(fragment_cache.size, 0)
+
+    def test_bulk_shows(self):
+        venue_id, = self.add(self.venue("Blue Note"))
+        artist_ids = self.add(self.artist("One"), self.artist("Two"))
+
+        res = self.client().post(
+            "/shows/bulk",
+            json={
+                "shows": [
+                    {
+                        "venue_id": venue_id,
+                        "artist_id": artist_ids[0],
+                        "start_time": "2035-05-01T20:00:00",
+                    },
+                    {
+                        "venue_id": venue_id,
+                        "artist_id": artist_ids[1],
+                        "start_time": "2035-05-01T21:00:00",
+                    },
+                    {
+                        "venue_id": 999,
+                        "artist_id": artist_ids[1],
+                        "start_time": "2035-05-02T20:00:00",
+                    },
+                    {"venue_id": venue_id, "artist_id": artist_ids[1]},
+                ]
+            },
+        )
+        data = res.get_json()
+
+        self.assertEqual(data["created"], 1)
+        self.assertEqual(
+            [result["status"] for result in data["results"]],
+            ["created", "error", "error", "error"],
+        )
+        self.assertEqual(
+            data["results"][1]["error"], "overlaps another show at venue %d" % venue_id
+        )
+        self.assertEqual(data["results"][2]["error"], "unknown venue 999")
+        self.assertEqual(self.count(Show), 1)
+
+    def test_bulk_shows_query_count(self):
+        venue_ids = self.add(*[self.venue("Venue %d" % number) for number in range(50)])
+        artist_ids = self.add(
+            *[self.artist("Artist %d" % number) for number in range(50)]
+        )
+        shows = [
+            {"venue_id": venue_id, "artist_id": artist_id, "start_time": "2035-05-01"}
+            for venue_id, artist_id in zip(venue_ids, artist_ids)
+        ]
+
+        res = self.client().post("/shows/bulk", json={"shows": shows})
+
+        self.assertEqual(res.get_json()["created"], 50)
+        self.assertLessEqual(self.queries(res), 10)
+
+    def test_bulk_shows_mixed_offsets(self):
+        venue_id, = self.add(self.venue("Blue Note"))
+        artist_ids = self.add(self.artist("One"), self.artist("Two"))
+
+        res = self.client().post(
+            "/shows/bulk",
+            json={
+                "shows": [
+                    {
+                        "venue_id": venue_id,
+                        "artist_id": artist_ids[0],
+                        "start_time": "2035-05-01T10:00:00",
+                    },
+                    {
+                        "venue_id": venue_id,
+                        "artist_id": artist_ids[1],
+                        "start_time": "2035-05-01T11:00:00+02:00",
+                    },
+                ]
+            },
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()["created"], 1)
+        self.assertEqual(
+            res.get_json()["results"][1]["error"],
+            "overlaps another show at venue %d" % venue_id,
+        )
+
+    def test_edit_missing_venue(self):
+        res = self.client().post(
+            "/venues/77/edit", data={"name": "Ghost Hall", "genres": ["Ghost"]}
+        )
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(self.count(GenreCount), 0)
+
+    def test_delete_venue_cascades_shows(self):
+        self.client().post(
+            "/venues/create",
+            data={
+                "name": "Blue Note",
+                "city": "New York",
+                "state": "NY",
+                "address": "131 W 3rd St",
+                "phone": "555-0100",
+                "facebook_link": "https://www.facebook.com/bluenote",
+                "genres": ["Jazz", "Soul"],
+            },
+        )
+        artist_id, = self.add(self.artist("One"))
+        with self.app.app_context():
+            venue_id = db.session.query(Venue.id).scalar()
+        self.add(
+            Show(
+                venue_id=venue_id,
+                artist_id=artist_id,
+                start_time=datetime(2035, 5, 1, 20),
+            )
+        )
+
+        res = self.client().delete("/venues/%d" % venue_id)
+
+        self.assertEqual(res.get_json(), {"success": True, "deleted": 1})
+        self.assertEqual(self.count(Venue), 0)
+        self.assertEqual(self.count(Show), 0)
+        self.assertEqual(self.count(Artist), 1)
+        with self.app.app_context():
+            counts = db.session.query(GenreCount.count).filter(
+                GenreCount.kind == "Venue"
+            )
+            self.assertEqual([count for (count,) in counts if count], [])
+
+    def test_delete_artist_frees_venue_slot(self):
+        venue_id, = self.add(self.venue("Blue Note"))
+        artist_ids = self.add(self.artist("One"), self.artist("Two"))
+        show = {"venue_id": venue_id, "start_time": "2035-05-01T20:00:00"}
+        self.client().post(
+            "/shows/bulk", json={"shows": [dict(show, artist_id=artist_ids[0])]}
+        )
+
+        self.client().delete("/artists/%d" % artist_ids[0])
+        res = self.client().post(
+            "/shows/bulk", json={"shows": [dict(show, artist_id=artist_ids[1])]}
+        )
+
+        self.assertEqual(res.get_json()["created"], 1)
+
+    def test_matches_rebuilt(self):
+        self.app.config["MATCH_INDEX_REBUILD_INTERVAL"] = 0
+        match_index.init_app(self.app)
+        venue = self.venue("Blue Note")
+        venue.seeking_talent = True
+        venue_id, = self.add(venue)
+        artist_id, = self.add(self.artist("One"))
+        first = self.client().get("/api/v1/artists/%d/matches" % artist_id)
+        # Inserted directly, as `flask fyyur-import` does from its own process.
+        late = self.venue("Late Night", ["Jazz", "Soul"], city="Oakland")
+        late.seeking_talent = True
+        self.add(late)
+
+        stale = self.client().get("/api/v1/artists/%d/matches" % artist_id)
+        match_index.wait()
+        res = self.client().get("/api/v1/artists/%d/matches" % artist_id)
+
+        self.assertEqual(
+            [match["id"] for match in first.get_json()["data"]], [venue_id]
+        )
+        self.assertEqual(stale.get_json()["data"], first.get_json()["data"])
+        self.assertEqual(
+            [match["name"] for match in res.get_json()["data"]],
+            ["Blue Note", "Late Night"],
+        )
+
+    def test_bulk_delete_artists(self):
+        ids = self.add(self.artist("One"), self.artist("Two"), self.artist("Three"))
+
+        res = self.client().post("/artists/delete", json={"ids": ids[:2] + [999]})
+        missing = self.client().post("/artists/delete", json={"ids": []})
+
+        self.assertEqual(res.get_json(), {"success": True, "deleted": 2})
+        self.assertEqual(self.count(Artist), 1)
+        self.assertEqual(missing.status_code, 400)
+
+    def test_import_existing_shows_rejected(self):
+        venue_id, = self.add(self.venue("Blue Note"))
+        artist_ids = self.add(self.artist("One"), self.artist("Two"))
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w") as f:
+            f.write("venue_id,artist_id,start_time\n")
+            f.write("%d,%d,2035-05-01T20:00:00\n" % (venue_id, artist_ids[0]))
+        self.addCleanup(os.remove, path)
+        runner = self.app.test_cli_runner()
+
+        first = runner.invoke(args=["fyyur-import", "--shows", path])
+        with open(path, "a") as f:
+            f.write("%d,%d,2035-05-02T20:00:00\n" % (venue_id, artist_ids[1]))
+        second = runner.invoke(args=["fyyur-import", "--shows", path])
+
+        self.assertIn("Show: 1 imported, 0 rejected", first.output)
+        self.assertEqual(second.exit_code, 0)
+        self.assertIn("Show: 1 imported, 1 rejected", second.output)
+        self.assertIn("duplicate show", second.output)
+        self.assertEqual(self.count(Show), 2)
+
+    def test_import_overlapping_shows_rejected(self):
+        venue_id, = self.add(self.venue("Blue Note"))
+        artist_ids = self.add(*[self.artist(name) for name in ("A", "B", "C")])
+        self.add(
+            Show(
+                venue_id=venue_id,
+                artist_id=artist_ids[0],
+                start_time=datetime(2035, 5, 1, 20),
+            )
+        )
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w") as f:
+            f.write("venue_id,artist_id,start_time,duration\n")
+            f.write("%d,%d,2035-05-01T21:00:00,60\n" % (venue_id, artist_ids[1]))
+            f.write("%d,%d,2035-05-02T20:00:00Z,60\n" % (venue_id, artist_ids[2]))
+        self.addCleanup(os.remove, path)
+
+        res = self.app.test_cli_runner().invoke(args=["fyyur-import", "--shows", path])
+
+        self.assertIn("Show: 1 imported, 1 rejected", res.output)
+        self.assertIn("record 1: overlaps another show", res.output)
+        with self.app.app_context():
+            self.assertEqual(
+                db.session.query(Show.duration)
+                .filter(Show.artist_id == artist_ids[2])
+                .scalar(),
+                60,
+            )
+
+    def test_import_malformed_json_rejected(self):
+        fd, path = tempfile.mkstemp(suffix=".ndjson")
+        with os.fdopen(fd, "w") as f:
+            f.write('{"name": "Broken",\n')
+            f.write('["not", "an", "object"]\n')
+            f.write(
+                '{"name": "Odd", "city": "Oakland", "state": "CA", "phone": "1", '
+                '"genres": 5, "facebook_link": "https://www.facebook.com/odd"}\n'
+            )
+            f.write(
+                '{"name": "Fine", "city": "Oakland", "state": "CA", "phone": "1", '
+                '"genres": "Jazz", "facebook_link": "https://www.facebook.com/fine"}\n'
+            )
+        self.addCleanup(os.remove, path)
+
+        res = self.app.test_cli_runner().invoke(
+            args=["fyyur-import", "--artists", path]
+        )
+
+        self.assertEqual(res.exit_code, 0)
+        self.assertIn("Artist: 1 imported, 3 rejected", res.output)
+        self.assertIn("record 1: line 1: bad JSON", res.output)
+        self.assertIn("record 2: not an object", res.output)
+        self.assertIn("record 3: bad genres 5", res.output)
+        self.assertEqual(self.count(Artist), 1)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
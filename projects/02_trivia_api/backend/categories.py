@@ -0,0 +1,52 @@
+import threading
+import time
+
+from models import Category
+
+CATEGORY_CACHE_TTL = 300
+
+
+class CategoryRegistry(object):
+    """Category id to type, loaded with one query and kept in memory.
+
+    The mapping is reloaded after `ttl` seconds, or on the next lookup
+    after `invalidate()`; anything that writes categories should call it.
+    Between reloads, lookups make no database round trip.
+    """
+
+    def __init__(self, ttl=CATEGORY_CACHE_TTL):
+        self.ttl = ttl
+        self._types = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def types(self):
+        """{id: type} of every category, ordered by id."""
+        types = self._types
+        if types is None or time.time() - self._loaded_at > self.ttl:
+            with self._lock:
+                if self._stale():
+                    self._types = {
+                        category.id: category.type
+                        for category in Category.query.order_by(Category.id)
+                    }
+                    self._loaded_at = time.time()
+                types = self._types
+        return types
+
+    def type_of(self, id):
+        """The type of category `id`, or '' for an unknown id."""
+        try:
+            return self.types().get(int(id), '')
+        except (TypeError, ValueError):
+            return ''
+
+    def __contains__(self, id):
+        return id in self.types()
+
+    def _stale(self):
+        return self._types is None or time.time() - self._loaded_at > self.ttl
+
+    def invalidate(self):
+        with self._lock:
+            self._types = None
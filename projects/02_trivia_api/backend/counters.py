@@ -0,0 +1,57 @@
+import threading
+import time
+
+from sqlalchemy import func
+
+from models import Question, db
+
+COUNTER_RECONCILE_INTERVAL = 300
+
+
+class QuestionCounters(object):
+    """Total and per-category question counts, kept in memory.
+
+    Question.insert() and Question.delete() report each change, so reading
+    a count costs no query. Writes that bypass them (another process, a
+    bulk statement, a rolled back race with a reconcile) are corrected by
+    recounting with one GROUP BY query every `interval` seconds.
+    """
+
+    def __init__(self, interval=COUNTER_RECONCILE_INTERVAL):
+        self.interval = interval
+        self._counts = None
+        self._reconciled_at = 0
+        self._lock = threading.Lock()
+
+    def total(self):
+        return sum(self._current().values())
+
+    def added(self, category):
+        self._change(category, 1)
+
+    def removed(self, category):
+        self._change(category, -1)
+
+    def reconcile(self):
+        counts = {
+            str(category): count
+            for category, count in db.session.query(
+                Question.category, func.count(Question.id)
+            ).group_by(Question.category)
+        }
+        with self._lock:
+            self._counts = counts
+            self._reconciled_at = time.time()
+        return counts
+
+    def _current(self):
+        counts = self._counts
+        if counts is None or time.time() - self._reconciled_at > self.interval:
+            counts = self.reconcile()
+        return counts
+
+    def _change(self, category, delta):
+        with self._lock:
+            if self._counts is not None:
+                key = str(category)
+                self._counts[key] = max(self._counts.get(key, 0) + delta, 0)
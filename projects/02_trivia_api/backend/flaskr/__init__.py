@@ -2,17 +2,37 @@ import os
 from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
 from sqlalchemy.sql.expression import func, select
 
-from models import setup_db, Question, Category, db
+from models import setup_db, Question
+from querycount import QueryCounter
+from categories import CATEGORY_CACHE_TTL, CategoryRegistry
+from quiz import QUESTION_POOL_RELOAD_INTERVAL, QuestionPool
+from quiz_sessions import session_store
+from counters import COUNTER_RECONCILE_INTERVAL, QuestionCounters
 
 QUESTIONS_PER_PAGE = 10
 
 
 def create_app(test_config=None):
     app = Flask(__name__)
+    if test_config is not None:
+        app.config.update(test_config)
     setup_db(app)
+    QueryCounter(app)
+    categories = CategoryRegistry(
+        app.config.get("CATEGORY_CACHE_TTL", CATEGORY_CACHE_TTL))
+    app.extensions["categories"] = categories
+    question_pool = QuestionPool(
+        app.config.get("QUESTION_POOL_RELOAD_INTERVAL",
+                       QUESTION_POOL_RELOAD_INTERVAL))
+    app.extensions["question_pool"] = question_pool
+    quiz_sessions = session_store(app.config)
+    app.extensions["quiz_sessions"] = quiz_sessions
+    counters = QuestionCounters(
+        app.config.get("COUNTER_RECONCILE_INTERVAL",
+                       COUNTER_RECONCILE_INTERVAL))
+    app.extensions["question_counters"] = counters
     CORS(app, resources=r'/api/*')
 
     @app.route("/")
@@ -29,8 +49,8 @@ def create_app(test_config=None):
 
     @app.route("/categories")
     def get_categories():
-        categories = Category.query.all()
-        formatted_categories = [category.format() for category in categories]
+        formatted_categories = [{"id": id, "type": type}
+                                for id, type in categories.types().items()]
 
         return jsonify({
             "categories": formatted_categories
@@ -39,38 +59,39 @@ def create_app(test_config=None):
     @app.route("/questions")
     def get_questions():
         page = request.args.get("page", 1, type=int)
+        after_id = request.args.get("after_id", type=int)
         if (page <= 0):
             abort(400)
-        start = (page - 1) * 10
-        end = start + 10
-        questions = Question.query.all()
-        formatted_questions = [question.format() for question in questions]
-        categories = set()
-        for question in questions:
-            category_type = get_category_type(question.category)
-            categories.add(category_type)
+
+        query = Question.query.order_by(Question.id)
+        if after_id is not None:
+            # Keyset mode: walks the primary key index from after_id, so a
+            # deep page costs the same as the first one.
+            query = query.filter(Question.id > after_id)
+        else:
+            query = query.offset((page - 1) * QUESTIONS_PER_PAGE)
+        questions = query.limit(QUESTIONS_PER_PAGE).all()
 
         return jsonify({
-            "questions": formatted_questions[start:end],
-            "total_questions": len(formatted_questions),
-            "categories": list(categories),
-            "current_category": None
+            "questions": [question.format() for question in questions],
+            "total_questions": counters.total(),
+            "categories": list(categories.types().values()),
+            "current_category": None,
+            "next_after_id": (questions[-1].id
+                              if len(questions) == QUESTIONS_PER_PAGE
+                              else None)
         })
 
     def get_category_type(id):
-        categories = Category.query.all()
-        category_found = ''
-
-        for category in categories:
-            if (category.id == id):
-                category_found = category.type
-        return category_found
+        return categories.type_of(id)
 
     @app.route('/questions/<int:id>', methods=["DELETE"])
     def delete_question_by_id(id):
         try:
-            Question.query.filter(Question.id == id).delete()
-            db.session.commit()
+            question = Question.query.get(id)
+            if question is not None:
+                question.delete()
+            question_pool.remove(id)
 
             return jsonify({
                 "success": True
@@ -132,6 +153,7 @@ def create_app(test_config=None):
             question = Question(question=question, answer=answer,
                                 category=category, difficulty=difficulty)
             question.insert()
+            question_pool.add(question.id, question.category)
             return jsonify({
                 "success": True
             })
@@ -148,7 +170,6 @@ def create_app(test_config=None):
                 abort(400)
 
             search = "%{}%".format(searchTerm)
-            all_questions = Question.query.all()
             questions_found = Question.query.filter(
                 Question.question.ilike(search))
             questions_found_formatted = [
@@ -156,7 +177,7 @@ def create_app(test_config=None):
 
             return jsonify({
                 "questions": questions_found_formatted,
-                "total_questions": len(all_questions),
+                "total_questions": counters.total(),
                 "current_category": None
             })
         except:
@@ -164,27 +185,66 @@ def create_app(test_config=None):
 
     @app.route('/categories/<int:id>/questions')
     def get_question_by_category_id(id):
+        if id not in categories:
+            abort(404)
         try:
-            if(id < 1 or id > 6):
-                abort(404)
             category_type = get_category_type(id)
-            all_questions = Question.query.all()
             questions = Question.query.filter(
                 Question.category == id).all()
             questions_formatted = [question.format() for question in questions]
 
             return jsonify({
                 "questions": questions_formatted,
-                "total_questions": len(all_questions),
+                "total_questions": counters.total(),
                 "current_category": category_type
             })
         except Exception as e:
             print(e)
             abort(500)
 
+    def pick_question(category, previous):
+        while True:
+            question_id = question_pool.pick(category, previous)
+            if question_id is None:
+                return None
+            question = Question.query.get(question_id)
+            if question is not None:
+                return question
+            # Deleted by another process since the pool was loaded.
+            question_pool.remove(question_id)
+
+    @app.route('/quizzes/sessions', methods=["POST"])
+    def create_quiz_session():
+        body = request.get_json()
+        category = body.get("quiz_category") if body else None
+        if (category == None or category.get('id') == None):
+            abort(400)
+
+        return jsonify({
+            "success": True,
+            "session_id": quiz_sessions.create(str(category['id']))
+        })
+
     @app.route('/quizzes', methods=["POST"])
     def get_quizz_question():
         body = request.get_json()
+        session_id = body.get("session_id")
+        if session_id is not None:
+            # The server remembers what was asked, so the request stays the
+            # same size however long the quiz runs.
+            session = quiz_sessions.get(session_id)
+            if session is None:
+                abort(404)
+            category, seen = session
+            question = pick_question(category, seen)
+            if question is not None:
+                seen.add(question.id)
+                quiz_sessions.save(session_id, category, seen)
+            return jsonify({
+                "question": question.format() if question else None,
+                "session_id": session_id
+            })
+
         previous_questions = body.get("previous_questions")
         category = body.get("quiz_category")
         if (previous_questions == None):
@@ -192,20 +252,11 @@ def create_app(test_config=None):
         if (category == None):
             abort(400)
 
-        category_id = category['id']
-        if (category['id'] == 0):
-            category_id = random.randint(1, 6)
-
-        random_question = random.choice(
-            Question.query.filter(Question.category == category_id).all())
-        tries = 0
-        max_tries = 100
-        while ((random_question.id in previous_questions) or (tries > max_tries)):
-            random_question = random.choice(Question.query.all())
-            tries += 1
-        else:
-            return jsonify({
-                "question": random_question.format()
-            })
+        question = pick_question(category['id'], set(previous_questions))
+
+        # A null question tells the client the category is exhausted.
+        return jsonify({
+            "question": question.format() if question else None
+        })
 
     return app
@@ -1,5 +1,6 @@
 import os
 from sqlalchemy import Column, String, Integer, create_engine
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -22,6 +23,12 @@ def setup_db(app, database_path=database_path):
     db.create_all()
 
 
+def question_counters():
+    '''The app's QuestionCounters, if it keeps any.'''
+    if has_app_context():
+        return current_app.extensions.get("question_counters")
+
+
 '''
 Question
 
@@ -46,6 +53,9 @@ class Question(db.Model):
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        counters = question_counters()
+        if counters is not None:
+            counters.added(self.category)
 
     def update(self):
         db.session.commit()
@@ -53,6 +63,9 @@ class Question(db.Model):
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        counters = question_counters()
+        if counters is not None:
+            counters.removed(self.category)
 
     def format(self):
         return {
@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+
+from models import Question, db
+
+# Category ids are stored as strings on Question; "0" means any category.
+ALL_CATEGORIES = "0"
+MAX_SAMPLES = 8
+QUESTION_POOL_RELOAD_INTERVAL = 300
+
+
+class QuestionPool(object):
+    """Question ids per category, kept in memory to pick quiz questions.
+
+    Ids live in one array per category (and one for all questions) with a
+    position map beside each, so adding and removing an id are O(1)
+    swap-removes. `pick` samples the array against the set of previous
+    questions, which takes O(1) draws on average while most questions are
+    unseen; once MAX_SAMPLES draws all hit seen questions it filters the
+    array instead. The pool is loaded with one query on first use and kept
+    current by `add` and `remove`; questions written by other processes
+    are picked up by reloading it every `interval` seconds. A reload runs
+    its query outside the lock, so picks keep using the old pool until
+    the new one is swapped in.
+    """
+
+    def __init__(self, interval=QUESTION_POOL_RELOAD_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._ids = None
+        self._positions = None
+        self._category_of = None
+        self._loaded_at = 0
+        self._reloading = False
+
+    def pick(self, category, previous):
+        """A random id from `category` not in `previous`, or None if none.
+
+        `previous` is a set, or anything else iterable that answers `in`
+        quickly, such as a session's SeenQuestions.
+        """
+        self._load()
+        with self._lock:
+            ids = self._ids.get(str(category), [])
+            positions = self._positions.get(str(category), {})
+            seen = sum(1 for id in previous if id in positions)
+            if seen >= len(ids):
+                return None
+            for _ in range(MAX_SAMPLES):
+                id = random.choice(ids)
+                if id not in previous:
+                    return id
+            return random.choice([id for id in ids if id not in previous])
+
+    def add(self, id, category):
+        with self._lock:
+            if self._ids is not None:
+                self._add(id, category)
+
+    def remove(self, id):
+        with self._lock:
+            if self._ids is not None and id in self._category_of:
+                category = self._category_of.pop(id)
+                self._remove(ALL_CATEGORIES, id)
+                self._remove(str(category), id)
+
+    def _load(self):
+        with self._lock:
+            if self._ids is not None and (
+                self._reloading or time.time() - self._loaded_at <= self.interval
+            ):
+                return
+            self._reloading = self._ids is not None
+        try:
+            ids, positions, category_of = {ALL_CATEGORIES: []}, {ALL_CATEGORIES: {}}, {}
+            loaded_at = time.time()
+            for id, category in db.session.query(Question.id, Question.category):
+                index(ids, positions, category_of, id, category)
+            with self._lock:
+                self._ids, self._positions = ids, positions
+                self._category_of = category_of
+                self._loaded_at = loaded_at
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def _add(self, id, category):
+        index(self._ids, self._positions, self._category_of, id, category)
+
+    def _remove(self, key, id):
+        ids, positions = self._ids[key], self._positions[key]
+        index = positions.pop(id)
+        last = ids.pop()
+        if last != id:
+            ids[index] = last
+            positions[last] = index
+
+
+def index(ids, positions, category_of, id, category):
+    category_of[id] = category
+    for key in (ALL_CATEGORIES, str(category)):
+        key_positions = positions.setdefault(key, {})
+        if id not in key_positions:
+            key_ids = ids.setdefault(key, [])
+            key_positions[id] = len(key_ids)
+            key_ids.append(id)
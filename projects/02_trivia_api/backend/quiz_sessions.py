@@ -0,0 +1,225 @@
+import secrets
+import sqlite3
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+QUIZ_SESSION_TTL = 3600
+
+# Roaring-style containers: ids are split on their high 16 bits, and each
+# chunk keeps its low 16 bits in a sorted array until it would outgrow a
+# 65536-bit bitmap.
+ARRAY_LIMIT = 4096
+BITMAP_BYTES = 65536 // 8
+_HEADER = struct.Struct("<IBI")
+
+
+class SeenQuestions(object):
+    """Compact set of question ids already asked in a quiz.
+
+    A quiz of a few dozen questions takes a few dozen bytes of arrays,
+    however large the ids; dense chunks switch to a fixed 8 KB bitmap.
+    """
+
+    __slots__ = ("_containers",)
+
+    def __init__(self, ids=()):
+        self._containers = {}
+        for id in ids:
+            self.add(id)
+
+    def add(self, id):
+        high, low = id >> 16, id & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            container = self._containers[high] = array("H")
+        if isinstance(container, bytearray):
+            container[low >> 3] |= 1 << (low & 7)
+            return
+        index = bisect_left(container, low)
+        if index < len(container) and container[index] == low:
+            return
+        container.insert(index, low)
+        if len(container) > ARRAY_LIMIT:
+            bitmap = bytearray(BITMAP_BYTES)
+            for value in container:
+                bitmap[value >> 3] |= 1 << (value & 7)
+            self._containers[high] = bitmap
+
+    def __contains__(self, id):
+        container = self._containers.get(id >> 16)
+        if container is None:
+            return False
+        low = id & 0xFFFF
+        if isinstance(container, bytearray):
+            return bool(container[low >> 3] & (1 << (low & 7)))
+        index = bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def __iter__(self):
+        for high in sorted(self._containers):
+            container = self._containers[high]
+            if isinstance(container, bytearray):
+                lows = (
+                    byte * 8 + bit
+                    for byte, value in enumerate(container)
+                    if value
+                    for bit in range(8)
+                    if value & (1 << bit)
+                )
+            else:
+                lows = container
+            for low in lows:
+                yield high << 16 | low
+
+    def __len__(self):
+        return sum(
+            sum(bin(value).count("1") for value in container)
+            if isinstance(container, bytearray)
+            else len(container)
+            for container in self._containers.values()
+        )
+
+    def to_bytes(self):
+        parts = []
+        for high, container in sorted(self._containers.items()):
+            bitmap = isinstance(container, bytearray)
+            payload = bytes(container) if bitmap else container.tobytes()
+            parts.append(_HEADER.pack(high, bitmap, len(payload)))
+            parts.append(payload)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        seen = cls()
+        offset = 0
+        while offset < len(data):
+            high, bitmap, size = _HEADER.unpack_from(data, offset)
+            offset += _HEADER.size
+            payload = data[offset : offset + size]
+            offset += size
+            if bitmap:
+                seen._containers[high] = bytearray(payload)
+            else:
+                container = array("H")
+                container.frombytes(payload)
+                seen._containers[high] = container
+        return seen
+
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+
+class MemorySessionStore(object):
+    """Quiz sessions in a dict, evicted `ttl` seconds after their last use.
+
+    Sessions belong to the process that created them, so with several
+    workers use SQLiteSessionStore or sticky routing.
+    """
+
+    def __init__(self, ttl=QUIZ_SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, category):
+        session_id = new_session_id()
+        self.save(session_id, category, SeenQuestions())
+        return session_id
+
+    def get(self, session_id):
+        """(category, SeenQuestions) of a live session, or None."""
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            return None if session is None else session[:2]
+
+    def save(self, session_id, category, seen):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._sessions[session_id] = (category, seen, time.time() + self.ttl)
+            self._evict()
+
+    def _evict(self):
+        # Ordered by last use, so expired sessions are at the front.
+        now = time.time()
+        while self._sessions:
+            session_id, (category, seen, expires_at) = next(
+                iter(self._sessions.items())
+            )
+            if expires_at > now:
+                break
+            del self._sessions[session_id]
+
+
+class SQLiteSessionStore(object):
+    """Quiz sessions in a SQLite file shared by all workers on the host.
+
+    The seen set is stored as the serialized SeenQuestions, and expired
+    sessions are deleted whenever a session is created.
+    """
+
+    def __init__(self, path, ttl=QUIZ_SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS quiz_sessions ("
+                "id TEXT PRIMARY KEY, category TEXT NOT NULL, "
+                "seen BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_quiz_sessions_expires_at "
+                "ON quiz_sessions (expires_at)"
+            )
+
+    def create(self, category):
+        session_id = new_session_id()
+        with self._connection() as connection:
+            connection.execute(
+                "DELETE FROM quiz_sessions WHERE expires_at <= ?", (time.time(),)
+            )
+        self.save(session_id, category, SeenQuestions())
+        return session_id
+
+    def get(self, session_id):
+        row = (
+            self._connection()
+            .execute(
+                "SELECT category, seen FROM quiz_sessions "
+                "WHERE id = ? AND expires_at > ?",
+                (session_id, time.time()),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return row[0], SeenQuestions.from_bytes(row[1])
+
+    def save(self, session_id, category, seen):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO quiz_sessions VALUES (?, ?, ?, ?)",
+                (session_id, category, seen.to_bytes(), time.time() + self.ttl),
+            )
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            self._local.connection = connection
+        return connection
+
+
+def session_store(config):
+    """The store named by QUIZ_SESSION_DB: a SQLite path, or memory."""
+    ttl = config.get("QUIZ_SESSION_TTL", QUIZ_SESSION_TTL)
+    path = config.get("QUIZ_SESSION_DB")
+    if path:
+        return SQLiteSessionStore(path, ttl)
+    return MemorySessionStore(ttl)
@@ -3,8 +3,16 @@ import unittest
 import json
 from flask_sqlalchemy import SQLAlchemy
 
-from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr import create_app, QUESTIONS_PER_PAGE
+from models import setup_db, Question, Category, db
+from querycount import QueryBudgetExceeded
+
+TEST_CONFIG = {
+    "TESTING": True,
+    "QUERY_BUDGET_STRICT": True,
+    "QUERY_BUDGET": 5,
+    "QUERY_BUDGETS": {},
+}
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -12,7 +20,7 @@ class TriviaTestCase(unittest.TestCase):
 
     def setUp(self):
         """Define test variables and initialize app."""
-        self.app = create_app()
+        self.app = create_app(TEST_CONFIG)
         self.client = self.app.test_client
         self.database_name = "trivia_test"
         self.database_path = "postgres://{}/{}".format(
@@ -44,6 +52,26 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertTrue(len(data["questions"]))
 
+    def test_questions_page_size(self):
+        res = self.client().get('/questions?page=1')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertLessEqual(len(data["questions"]), QUESTIONS_PER_PAGE)
+        self.assertEqual(data["total_questions"], Question.query.count())
+
+    def test_questions_after_id(self):
+        first = json.loads(self.client().get('/questions').data)
+        after_id = first["questions"][0]["id"]
+        res = self.client().get('/questions?after_id={}'.format(after_id))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(all(question["id"] > after_id
+                            for question in data["questions"]))
+        self.assertEqual(data["questions"][0]["id"],
+                         first["questions"][1]["id"])
+
     def test_400_questions(self):
         res = self.client().get('/questions?page=0')
         data = json.loads(res.data)
@@ -102,6 +130,115 @@ class TriviaTestCase(unittest.TestCase):
 
         self.assertEqual(res.status_code, 200)
 
+    def test_categories_cached(self):
+        self.client().get('/categories')
+        res = self.client().get('/categories')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('desc="0 queries"', res.headers["Server-Timing"])
+
+    def test_404_unknown_category_questions(self):
+        res = self.client().get("/categories/1000/questions")
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data["success"], False)
+
+    def test_query_budget_exceeded(self):
+        app = create_app(dict(TEST_CONFIG, QUERY_BUDGET=0))
+
+        with self.assertRaises(QueryBudgetExceeded):
+            app.test_client().get('/categories')
+
+    def test_server_timing_header(self):
+        res = self.client().get('/categories')
+
+        self.assertTrue(res.headers["Server-Timing"].startswith("db;dur="))
+
+    def test_quizz_question_skips_previous(self):
+        category = json.loads(
+            self.client().get("/categories/6/questions").data)
+        ids = [question["id"] for question in category["questions"]]
+        res = self.client().post('/quizzes',
+                                 json={"previous_questions": ids[1:], "quiz_category": {"type": "Sports", "id": 6}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data["question"]["id"], ids[0])
+
+    def test_quizz_question_exhausted(self):
+        category = json.loads(
+            self.client().get("/categories/6/questions").data)
+        ids = [question["id"] for question in category["questions"]]
+        res = self.client().post('/quizzes',
+                                 json={"previous_questions": ids, "quiz_category": {"type": "Sports", "id": 6}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIsNone(data["question"])
+
+    def test_quizz_pool_reloads(self):
+        app = create_app(dict(TEST_CONFIG, QUESTION_POOL_RELOAD_INTERVAL=0))
+        client = app.test_client()
+        category = json.loads(client.get("/categories/6/questions").data)
+        ids = [question["id"] for question in category["questions"]]
+        client.post('/quizzes',
+                    json={"previous_questions": ids, "quiz_category": {"type": "Sports", "id": 6}})
+        # Written behind the pool's back, as another worker would.
+        with app.app_context():
+            question = Question(question="Reloaded?", answer="Yes",
+                                category="6", difficulty=1)
+            db.session.add(question)
+            db.session.commit()
+            question_id = question.id
+
+        res = client.post('/quizzes',
+                          json={"previous_questions": ids, "quiz_category": {"type": "Sports", "id": 6}})
+        data = json.loads(res.data)
+
+        self.assertEqual(data["question"]["id"], question_id)
+        with app.app_context():
+            Question.query.get(question_id).delete()
+
+    def test_quizz_session(self):
+        res = self.client().post('/quizzes/sessions',
+                                 json={"quiz_category": {"type": "Sports", "id": 6}})
+        session_id = json.loads(res.data)["session_id"]
+        category = json.loads(
+            self.client().get("/categories/6/questions").data)
+
+        asked = []
+        for _ in category["questions"]:
+            res = self.client().post('/quizzes', json={"session_id": session_id})
+            asked.append(json.loads(res.data)["question"]["id"])
+        res = self.client().post('/quizzes', json={"session_id": session_id})
+        data = json.loads(res.data)
+
+        self.assertEqual(sorted(asked), sorted(
+            question["id"] for question in category["questions"]))
+        self.assertIsNone(data["question"])
+
+    def test_404_unknown_quizz_session(self):
+        res = self.client().post('/quizzes', json={"session_id": "expired"})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data["success"], False)
+
+    def test_total_questions_counted(self):
+        total = json.loads(self.client().get('/questions').data)[
+            "total_questions"]
+        res = self.client().post('/questions', json={
+            "question": "Counted?", "answer": "Yes", "category": 1, "difficulty": 1})
+        after_insert = json.loads(self.client().get('/questions').data)
+        question = Question.query.filter(
+            Question.question == "Counted?").first()
+        self.client().delete('/questions/{}'.format(question.id))
+        after_delete = json.loads(self.client().get('/questions').data)
+
+        self.assertEqual(after_insert["total_questions"], total + 1)
+        self.assertEqual(after_delete["total_questions"], total)
+
     def test_error_get_quizz_question(self):
         res = self.client().post('/quizzes',
                                  json={"previous_questions": [], "quiz_category": None})
@@ -0,0 +1,131 @@
+import re
+import time
+from collections import Counter
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REPEAT_THRESHOLD = 3
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+_BIND_PARAMETERS = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\?")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats(object):
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def repeated(self, threshold=REPEAT_THRESHOLD):
+        """(count, shape) for statements run at least `threshold` times."""
+        return [
+            (count, shape)
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+def statement_shape(statement):
+    """`statement` with literals and bind parameters replaced by "?".
+
+    Queries that differ only in their values, like the per-row lookups of
+    an N+1 pattern or IN lists of different lengths, get the same shape.
+    """
+    shape = _BIND_PARAMETERS.sub("?", _LITERALS.sub("?", statement))
+    return " ".join(_PLACEHOLDER_LISTS.sub("?", shape).split())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    started = conn.info["query_started"].pop()
+    stats = g.get("query_stats") if has_app_context() else None
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - started
+        stats.shapes[statement_shape(statement)] += 1
+
+
+class QueryCounter(object):
+    """Counts the SQL statements and database time of each request.
+
+    Every response gets a Server-Timing header ("db;dur=<ms>;desc=...")
+    and a debug log line listing statement shapes run REPEAT_THRESHOLD or
+    more times, the usual sign of a query issued per row. Budgets are read
+    from QUERY_BUDGETS (endpoint name to maximum query count, None for no
+    limit) falling back to QUERY_BUDGET; with QUERY_BUDGET_STRICT set, a
+    request over its budget raises QueryBudgetExceeded, which fails the
+    test that made it. Statements run while a streamed response is being
+    sent happen after the count is taken and are not included.
+    """
+
+    _listening = False
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("QUERY_BUDGET", None)
+        app.config.setdefault("QUERY_BUDGETS", {})
+        app.config.setdefault("QUERY_BUDGET_STRICT", False)
+        app.config.setdefault("QUERY_REPEAT_THRESHOLD", REPEAT_THRESHOLD)
+        if not QueryCounter._listening:
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+            QueryCounter._listening = True
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.query_stats = QueryStats()
+
+    def _finish(self, response):
+        stats = g.pop("query_stats", None)
+        if stats is None:
+            return response
+        milliseconds = stats.seconds * 1000
+        response.headers.add(
+            "Server-Timing",
+            'db;dur=%.1f;desc="%d queries"' % (milliseconds, stats.count),
+        )
+        repeated = stats.repeated(current_app.config["QUERY_REPEAT_THRESHOLD"])
+        current_app.logger.debug(
+            "%s %s: %d queries in %.1f ms%s",
+            request.method,
+            request.path,
+            stats.count,
+            milliseconds,
+            "".join("\n  %dx %s" % pair for pair in repeated),
+        )
+
+        budgets = current_app.config["QUERY_BUDGETS"]
+        if request.endpoint in budgets:
+            budget = budgets[request.endpoint]
+        else:
+            budget = current_app.config["QUERY_BUDGET"]
+        if (
+            current_app.config["QUERY_BUDGET_STRICT"]
+            and budget is not None
+            and stats.count > budget
+        ):
+            raise QueryBudgetExceeded(
+                "%s ran %d queries, budget is %d%s"
+                % (
+                    request.endpoint,
+                    stats.count,
+                    budget,
+                    "".join("\n  %dx %s" % pair for pair in repeated),
+                )
+            )
+        return response
+
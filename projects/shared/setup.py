@@ -0,0 +1,13 @@
+"""Modules shared by the Fyyur and Trivia apps.
+
+Both list this directory in their requirements.txt (``-e ../../shared``),
+so ``pip install -r requirements.txt`` in either app installs it.
+"""
+from setuptools import setup
+
+setup(
+    name="fsnd-shared",
+    version="0.1.0",
+    py_modules=["querycount"],
+    install_requires=["Flask", "SQLAlchemy"],
+)